@@ -9,16 +9,140 @@ QDRANT_URL = os.getenv("QDRANT_URL", "localhost")
 QDRANT_PORT = int(os.getenv("QDRANT_PORT", "6333"))
 QDRANT_COLLECTION_NAME = os.getenv("QDRANT_COLLECTION_NAME", "contextmore")
 
+# Qdrant transport: gRPC avoids JSON-encoding large float vectors
+QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "false").lower() == "true"
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
+QDRANT_TIMEOUT = int(os.getenv("QDRANT_TIMEOUT", "30"))
+# Max (keep-alive) HTTP connections per client when using REST
+QDRANT_POOL_SIZE = int(os.getenv("QDRANT_POOL_SIZE", "32"))
+# Serve endpoint reads through AsyncQdrantClient instead of the qdrant thread stage
+QDRANT_ASYNC_CLIENT = os.getenv("QDRANT_ASYNC_CLIENT", "true").lower() == "true"
+
 # Vector dimensions
-# Note: Most sentence transformer models don't output 3072 dimensions by default
-# The actual output dimensions might be smaller (usually 768 or 1024)
-# To achieve 3072 dimensions, you can use a larger model or potentially
-# use techniques like concatenation or dimensionality expansion
-VECTOR_SIZE = 3072
+# Collections store the model's native embedding size (model.get_sentence_embedding_dimension()).
+# Collections created by older versions tiled 768-d vectors up to 3072 dimensions;
+# convert those with `python manage_collection.py migrate-dimensions`.
 
 # Model configuration
 # Using one of the largest sentence-transformer models available
 MODEL_NAME = 'sentence-transformers/all-mpnet-base-v2'  # 768 dimensions
 
-# Set this to True to recreate the collection with new vector dimensions
-RECREATE_COLLECTION = True 
\ No newline at end of file
+# Chunking: chunk sizes are counted in the model's own tokens. 0 uses the model's
+# max_seq_length minus its special tokens, so no chunk is truncated by the encoder.
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "0"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "0"))
+
+# Bulk encoding: texts are sorted by token length and grouped into model calls of at
+# most ENCODE_TOKEN_BUDGET padded tokens (batch size x longest text) and ENCODE_MAX_BATCH_SIZE texts
+ENCODE_TOKEN_BUDGET = int(os.getenv("ENCODE_TOKEN_BUDGET", "16384"))
+ENCODE_MAX_BATCH_SIZE = int(os.getenv("ENCODE_MAX_BATCH_SIZE", "256"))
+
+# Encoder inference backend: "torch" (PyTorch eager), "onnx" (ONNX Runtime) or
+# "onnx-int8" (dynamically int8-quantized ONNX export). ONNX exports are built on
+# first use and cached under MODEL_CACHE_DIR.
+MODEL_BACKENDS = ("torch", "onnx", "onnx-int8")
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "torch")
+MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "mcp_agent", "models"))
+# Quantization target for onnx-int8: arm64, avx2, avx512 or avx512_vnni
+ONNX_QUANTIZATION = os.getenv("ONNX_QUANTIZATION", "avx512_vnni")
+# Encoder thread pools; 0 keeps the library default
+ENCODER_INTRA_OP_THREADS = int(os.getenv("ENCODER_INTRA_OP_THREADS", "0"))
+ENCODER_INTER_OP_THREADS = int(os.getenv("ENCODER_INTER_OP_THREADS", "0"))
+# Persistent embedding store: chunk embeddings are kept on disk under EMBEDDING_STORE_DIR,
+# keyed by model, backend and chunk text hash, so re-ingesting unchanged text skips the model.
+# Empty disables it. The size is fixed when a store is first created.
+EMBEDDING_STORE_DIR = os.getenv("EMBEDDING_STORE_DIR", "")
+EMBEDDING_STORE_MAX_BYTES = int(os.getenv("EMBEDDING_STORE_MAX_BYTES", str(4 * 1024 * 1024 * 1024)))
+
+# Multi-process encoding of document chunks: ENCODER_PROCESSES model replicas in worker
+# processes (0 encodes in-process), each with ENCODER_THREADS_PER_PROCESS intra-op threads
+# (0: CPU count / processes). Queries are always encoded in-process.
+ENCODER_PROCESSES = int(os.getenv("ENCODER_PROCESSES", "0"))
+ENCODER_THREADS_PER_PROCESS = int(os.getenv("ENCODER_THREADS_PER_PROCESS", "0"))
+
+# Set RECREATE_COLLECTION=true to drop and re-create an existing collection on startup
+# (this deletes all stored documents); by default existing collections are kept
+RECREATE_COLLECTION = os.getenv("RECREATE_COLLECTION", "false").lower() == "true"
+
+# Execution stages: (max concurrent workers, max running + queued tasks)
+# Requests that would exceed a stage's pending limit are rejected with 429
+STAGE_LIMITS = {
+    "fetch": (int(os.getenv("FETCH_WORKERS", "8")), int(os.getenv("FETCH_MAX_PENDING", "64"))),
+    "extract": (int(os.getenv("EXTRACT_WORKERS", "2")), int(os.getenv("EXTRACT_MAX_PENDING", "16"))),
+    "inference": (int(os.getenv("INFERENCE_WORKERS", "1")), int(os.getenv("INFERENCE_MAX_PENDING", "8"))),
+    "query": (int(os.getenv("QUERY_WORKERS", "2")), int(os.getenv("QUERY_MAX_PENDING", "128"))),
+    "qdrant": (int(os.getenv("QDRANT_WORKERS", "16")), int(os.getenv("QDRANT_MAX_PENDING", "256"))),
+}
+
+# Query micro-batching: concurrent /retrieve queries arriving within the window
+# are encoded together in one model call
+QUERY_BATCH_WINDOW_MS = float(os.getenv("QUERY_BATCH_WINDOW_MS", "3"))
+QUERY_BATCH_MAX_SIZE = int(os.getenv("QUERY_BATCH_MAX_SIZE", "32"))
+
+# Query embedding cache (exact match on normalized query text)
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "10000"))
+QUERY_CACHE_TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL_SECONDS", "3600"))
+
+# /retrieve response cache, invalidated whenever this process writes to the collection.
+# The TTL bounds staleness from writers in other processes (e.g. the upload scripts).
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "2000"))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", "300"))
+
+# Bulk writes to Qdrant: points per request, concurrent requests and retry policy
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", "128"))
+UPSERT_PARALLELISM = int(os.getenv("UPSERT_PARALLELISM", "4"))
+UPSERT_MAX_RETRIES = int(os.getenv("UPSERT_MAX_RETRIES", "3"))
+UPSERT_RETRY_BACKOFF_SECONDS = float(os.getenv("UPSERT_RETRY_BACKOFF_SECONDS", "0.5"))
+
+# URL fetching: pooled async HTTP client shared by /embed and /embed-batch
+FETCH_MAX_CONNECTIONS = int(os.getenv("FETCH_MAX_CONNECTIONS", "100"))
+FETCH_MAX_PER_HOST = int(os.getenv("FETCH_MAX_PER_HOST", "8"))
+FETCH_TIMEOUT_SECONDS = float(os.getenv("FETCH_TIMEOUT_SECONDS", "30"))
+EMBED_BATCH_MAX_URLS = int(os.getenv("EMBED_BATCH_MAX_URLS", "500"))
+# URLs of one /embed-batch job prepared at once; keep well below the fetch and extract
+# pending limits so a single batch cannot saturate those stages on its own
+EMBED_BATCH_CONCURRENCY = int(os.getenv("EMBED_BATCH_CONCURRENCY", "4"))
+
+# Ingestion jobs: /embed, /embed-batch and /upload-document queue a job and return 202.
+# Jobs and spooled uploads are kept under JOBS_DIR so queued work survives a restart;
+# JOB_WORKERS jobs run at once, and submissions beyond JOB_QUEUE_MAX waiting jobs get 429.
+# Finished jobs can be polled for JOB_RETENTION_SECONDS. A job is started at most
+# JOB_MAX_ATTEMPTS times (retries after a saturated stage, with backoff, or a restart).
+JOBS_DIR = os.getenv("JOBS_DIR", os.path.join(os.path.expanduser("~"), ".cache", "mcp_agent", "jobs"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_QUEUE_MAX = int(os.getenv("JOB_QUEUE_MAX", "1000"))
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", "86400"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+
+# PDF extraction: files with at least PDF_PARALLEL_MIN_PAGES pages are split into
+# ranges of PDF_PAGES_PER_TASK pages and extracted in a process pool. The server's
+# pool has PDF_PROCESSES workers (0 extracts every PDF on the extract stage thread).
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "64"))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+PDF_PROCESSES = int(os.getenv("PDF_PROCESSES", "2"))
+
+# Largest accepted /upload-document file
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+
+# url -> doc_id lookups kept in memory for the "does this document exist" check
+DOC_ID_CACHE_MAX_ENTRIES = int(os.getenv("DOC_ID_CACHE_MAX_ENTRIES", "100000"))
+
+# Chunks returned per document by grouped /retrieve searches
+SEARCH_GROUP_SIZE = int(os.getenv("SEARCH_GROUP_SIZE", "4"))
+
+# Collection storage profiles: vector quantization ("scalar" int8 or "binary", searched with
+# rescoring against the originals and oversampling), original vectors on disk, and HNSW
+# graph (m, ef_construct) and search-time ef settings. STORAGE_PROFILE selects the profile
+# for new collections and `python manage_collection.py apply-profile`.
+STORAGE_PROFILES = {
+    "full": {"quantization": None, "on_disk": False, "hnsw_m": 16, "hnsw_ef_construct": 100,
+             "search_ef": None, "rescore": False, "oversampling": None},
+    "int8": {"quantization": "scalar", "on_disk": False, "hnsw_m": 16, "hnsw_ef_construct": 100,
+             "search_ef": 128, "rescore": True, "oversampling": 2.0},
+    "int8-disk": {"quantization": "scalar", "on_disk": True, "hnsw_m": 16, "hnsw_ef_construct": 100,
+                  "search_ef": 128, "rescore": True, "oversampling": 2.0},
+    "binary-disk": {"quantization": "binary", "on_disk": True, "hnsw_m": 16, "hnsw_ef_construct": 100,
+                    "search_ef": 128, "rescore": True, "oversampling": 3.0},
+}
+STORAGE_PROFILE = os.getenv("STORAGE_PROFILE", "full")
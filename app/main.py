@@ -1,17 +1,201 @@
 from fastapi import FastAPI, Request, HTTPException, UploadFile, Form, File
+from fastapi.responses import JSONResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from contextlib import asynccontextmanager, contextmanager
 from datetime import datetime
+import asyncio
+import json
+import multiprocessing
+import os
+import shutil
+import time
 import uuid
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
 from typing import List, Dict, Any, Optional
 
-from app.models.schemas import URLInput, QueryInput, FileUploadResponse
-from app.services.qdrant_service import QdrantService
+from app.models.schemas import (
+    URLInput,
+    BatchURLInput,
+    URLEmbedResult,
+    BatchEmbedResponse,
+    QueryInput,
+    FileUploadResponse,
+    JobAccepted,
+    JobStatus,
+)
+from app.services.qdrant_service import QdrantService, AsyncQdrantService, client_options
 from app.services.text_service import TextService
+from app.services.encoder_pool import EncoderPool
 from app.services.document_service import DocumentService
+from app.services.fetch_service import FetchService
+from app.services.query_encoder import QueryEncoder
+from app.services.ingestion_service import IngestionService, IngestionPlan
+from app.services.job_service import JobQueueFullError, JobService
+from app.config.settings import (
+    QDRANT_URL,
+    QDRANT_ASYNC_CLIENT,
+    STAGE_LIMITS,
+    QUERY_BATCH_WINDOW_MS,
+    QUERY_BATCH_MAX_SIZE,
+    RESULT_CACHE_MAX_ENTRIES,
+    RESULT_CACHE_MAX_BYTES,
+    RESULT_CACHE_TTL_SECONDS,
+    FETCH_MAX_CONNECTIONS,
+    FETCH_MAX_PER_HOST,
+    FETCH_TIMEOUT_SECONDS,
+    EMBED_BATCH_MAX_URLS,
+    EMBED_BATCH_CONCURRENCY,
+    MAX_UPLOAD_BYTES,
+    SEARCH_GROUP_SIZE,
+    ENCODER_PROCESSES,
+    ENCODER_THREADS_PER_PROCESS,
+    JOBS_DIR,
+    JOB_WORKERS,
+    JOB_QUEUE_MAX,
+    JOB_RETENTION_SECONDS,
+    JOB_MAX_ATTEMPTS,
+    PDF_PROCESSES,
+)
+from app.utils.cache import LRUCache
+from app.utils.results import format_grouped_results, format_chunk_results
+from app.utils.request_limits import BodySizeLimitMiddleware
+from app.utils.metrics import (
+    CHUNKS_PER_DOCUMENT,
+    HTTP_REQUEST_SECONDS,
+    CacheCollector,
+    step_timer,
+)
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, generate_latest
+from app.utils.concurrency import (
+    StageExecutor,
+    StageSaturatedError,
+    ClientDisconnectedError,
+    cancel_on_disconnect,
+)
 from fastapi_mcp import FastApiMCP
+from qdrant_client import QdrantClient
+
+# Services are created by the lifespan handler on startup, not at import time
+text_service: Optional[TextService] = None
+encoder_pool: Optional[EncoderPool] = None
+qdrant_service: Optional[QdrantService] = None
+async_qdrant_service: Optional[AsyncQdrantService] = None
+document_service = DocumentService()
+ingestion_service: Optional[IngestionService] = None
+fetch_service: Optional[FetchService] = None
+stages: Dict[str, StageExecutor] = {}
+query_encoder: Optional[QueryEncoder] = None
+job_service: Optional[JobService] = None
+# Extracts page ranges of large uploaded PDFs in parallel
+pdf_pool: Optional[ProcessPoolExecutor] = None
+
+# Set once startup (including warmup) has finished, cleared on shutdown
+ready = False
+startup_timings: Dict[str, float] = {}
+
+# Full /retrieve responses, keyed by the collection generation so any write invalidates them
+result_cache = LRUCache(
+    RESULT_CACHE_MAX_ENTRIES,
+    RESULT_CACHE_TTL_SECONDS,
+    max_bytes=RESULT_CACHE_MAX_BYTES,
+    sizeof=lambda response: len(json.dumps(response, default=str))
+)
+
+# The other caches belong to services and are added on startup
+cache_collector = CacheCollector({"retrieve_results": result_cache})
+REGISTRY.register(cache_collector)
+
+async def _phase(name: str, func, *args):
+    """Run a blocking startup phase in a thread and record how long it took"""
+    started = time.perf_counter()
+    result = await asyncio.to_thread(func, *args)
+    startup_timings[name] = time.perf_counter() - started
+    print(f"Startup phase {name} took {startup_timings[name]:.2f}s")
+    return result
+
+def _connect_qdrant() -> QdrantClient:
+    client = QdrantClient(QDRANT_URL, **client_options())
+    client.get_collections()
+    return client
+
+async def _warmup():
+    """Run one encode and one search so the first request doesn't pay for lazy initialization"""
+    embedding = await asyncio.to_thread(text_service.generate_embeddings, ["warmup"])
+    await qdrant_read("search_points", query_vector=embedding[0], limit=1)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global text_service, encoder_pool, qdrant_service, async_qdrant_service, ingestion_service
+    global fetch_service, stages, query_encoder, job_service, pdf_pool, ready
+    started = time.perf_counter()
 
-app = FastAPI()
+    # Loading the model(s) and reaching Qdrant don't depend on each other
+    phases = [_phase("load_model", TextService), _phase("connect_qdrant", _connect_qdrant)]
+    if ENCODER_PROCESSES > 0:
+        encoder_pool = EncoderPool(ENCODER_PROCESSES, ENCODER_THREADS_PER_PROCESS)
+        phases.append(_phase("start_encoder_pool", encoder_pool.start))
+    text_service, qdrant_client, *_ = await asyncio.gather(*phases)
+    text_service.encoder_pool = encoder_pool
+    qdrant_service = await _phase(
+        "ensure_collection",
+        lambda: QdrantService(vector_size=text_service.vector_size, client=qdrant_client)
+    )
+    async_qdrant_service = AsyncQdrantService(doc_id_cache=qdrant_service.doc_id_cache) if QDRANT_ASYNC_CLIENT else None
+    ingestion_service = IngestionService(text_service, qdrant_service)
+    fetch_service = FetchService(FETCH_MAX_CONNECTIONS, FETCH_MAX_PER_HOST, FETCH_TIMEOUT_SECONDS)
+
+    # Bounded executors keep blocking fetch, parsing, inference and Qdrant calls off the event loop.
+    # Queries get their own inference stage so retrieval latency is not tied to ingestion load.
+    stages = {name: StageExecutor(name, workers, pending) for name, (workers, pending) in STAGE_LIMITS.items()}
+    query_encoder = QueryEncoder(text_service, stages["query"], QUERY_BATCH_WINDOW_MS, QUERY_BATCH_MAX_SIZE)
+    if PDF_PROCESSES > 0:
+        pdf_pool = ProcessPoolExecutor(max_workers=PDF_PROCESSES, mp_context=multiprocessing.get_context("spawn"))
+    cache_collector.caches.update({
+        "query_embeddings": text_service.query_cache,
+        "doc_ids": qdrant_service.doc_id_cache
+    })
+    if text_service.embedding_store is not None:
+        cache_collector.caches["embedding_store"] = text_service.embedding_store
+
+    warmup_started = time.perf_counter()
+    await _warmup()
+    startup_timings["warmup"] = time.perf_counter() - warmup_started
+    print(f"Startup phase warmup took {startup_timings['warmup']:.2f}s")
+
+    # Queued ingestion runs in the background; jobs left over from a previous run resume
+    job_service = JobService(JOBS_DIR, JOB_QUEUE_MAX, JOB_RETENTION_SECONDS, JOB_MAX_ATTEMPTS)
+    job_service.start(
+        JOB_WORKERS,
+        {"embed": _run_embed_job, "embed_batch": _run_embed_batch_job, "upload": _run_upload_job},
+        retry_on=(StageSaturatedError,)
+    )
+
+    startup_timings["total"] = time.perf_counter() - started
+    print(f"Startup finished in {startup_timings['total']:.2f}s")
+    ready = True
+    try:
+        yield
+    finally:
+        ready = False
+        await job_service.stop()
+        job_service.close()
+        for stage in stages.values():
+            stage.shutdown()
+        if pdf_pool is not None:
+            pdf_pool.shutdown(wait=False, cancel_futures=True)
+        if encoder_pool is not None:
+            await asyncio.to_thread(encoder_pool.shutdown)
+        await fetch_service.close()
+        if async_qdrant_service is not None:
+            await async_qdrant_service.close()
+        qdrant_service.close()
+
+app = FastAPI(lifespan=lifespan)
+
+# Oversized uploads are refused while they stream in, not after they were spooled
+app.add_middleware(BodySizeLimitMiddleware, max_bytes=MAX_UPLOAD_BYTES, paths=["/upload-document"])
 
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -19,10 +203,60 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 # Initialize templates
 templates = Jinja2Templates(directory="templates")
 
-# Initialize services
-qdrant_service = QdrantService()
-text_service = TextService()
-document_service = DocumentService()
+async def qdrant_read(method: str, *args, **kwargs):
+    """Run a Qdrant read on the async client when enabled, otherwise on the qdrant stage"""
+    if async_qdrant_service is not None:
+        return await getattr(async_qdrant_service, method)(*args, **kwargs)
+    return await stages["qdrant"].run(getattr(qdrant_service, method), *args, **kwargs)
+
+@contextmanager
+def step(name: str):
+    """Time a processing step, and report it as the current stage when running inside a job"""
+    with step_timer(name), job_service.stage(name):
+        yield
+
+# URL credentials are never written to the job store; see JobService.submit()
+CREDENTIAL_FIELDS = {"auth_headers", "basic_auth"}
+
+# A batch URL that hits a full stage waits 0.5s, 1s, 2s for capacity before it is reported as failed
+BATCH_SATURATED_RETRIES = 3
+BATCH_RETRY_DELAY_SECONDS = 0.5
+
+def _has_credentials(url_input: URLInput) -> bool:
+    return url_input.auth_headers is not None or url_input.basic_auth is not None
+
+def _accepted(job_id: str) -> JobAccepted:
+    return JobAccepted(job_id=job_id, status="queued", status_url=f"/jobs/{job_id}")
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Latency per route, split by REST clients and MCP tool calls"""
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        # fastapi_mcp calls the app in-process through http://apiserver
+        transport = "mcp" if request.headers.get("host") == "apiserver" else "rest"
+        HTTP_REQUEST_SECONDS.labels(
+            transport, request.method, route.path if route else "unmatched", str(status)
+        ).observe(time.perf_counter() - started)
+
+@app.exception_handler(StageSaturatedError)
+async def stage_saturated_handler(request: Request, exc: StageSaturatedError):
+    return JSONResponse(status_code=429, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+@app.exception_handler(JobQueueFullError)
+async def job_queue_full_handler(request: Request, exc: JobQueueFullError):
+    return JSONResponse(status_code=429, content={"detail": str(exc)}, headers={"Retry-After": "5"})
+
+@app.exception_handler(ClientDisconnectedError)
+async def client_disconnected_handler(request: Request, exc: ClientDisconnectedError):
+    # Nobody is listening anymore; 499 mirrors the nginx convention for logs
+    return JSONResponse(status_code=499, content={"detail": "Client disconnected"})
 
 @app.get("/")
 async def read_root(request: Request):
@@ -45,209 +279,433 @@ async def get_retrieve_page(request: Request):
         "year": datetime.now().year
     })
 
-@app.post("/embed", operation_id="embed_document")
+@app.post("/embed", status_code=202, response_model=JobAccepted, operation_id="embed_document")
 async def embed_document(url_input: URLInput):
-    # Check if URL already exists
-    existing_doc_id = qdrant_service.get_existing_doc_id(url_input.url)
-    
+    """
+    Queue a URL for embedding. Returns a job ID; poll GET /jobs/{job_id} (get_job_status) for the result.
+    """
+    redacted = url_input.model_dump(mode="json", exclude=CREDENTIAL_FIELDS) if _has_credentials(url_input) else None
+    return _accepted(await job_service.submit("embed", url_input.model_dump(mode="json"), redacted_payload=redacted))
+
+async def _run_embed_job(payload: Dict[str, Any], file_path: Optional[str]) -> Dict[str, Any]:
+    return await _embed_document(URLInput(**payload))
+
+async def _embed_document(url_input: URLInput):
     try:
-        # Extract and process text with authentication if provided
-        text = text_service.extract_text_from_url(
-            url=str(url_input.url),
-            auth_headers=url_input.auth_headers,
-            basic_auth=url_input.basic_auth
-        )
-        chunks = text_service.chunk_text(text)
-        embeddings = text_service.generate_embeddings(chunks)
-        
-        # Generate a unique document ID (reuse if updating)
-        doc_id = existing_doc_id if existing_doc_id else str(uuid.uuid4())
         current_date = datetime.now().isoformat()
+        existing_doc_id, chunks, plan = await _prepare_url(url_input, current_date)
+        job_service.report(chunks=len(chunks), chunks_to_encode=len(plan.new_indices))
+        await _embed_plan(plan)
         
-        # If updating, delete existing chunks first
-        if existing_doc_id:
-            qdrant_service.delete_document_chunks(doc_id)
-        
-        # Prepare points for Qdrant
-        points = []
-        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-            points.append(
-                {
-                    "id": str(uuid.uuid4()),
-                    "vector": embedding,
-                    "payload": {
-                        "text": chunk,
-                        "url": str(url_input.url),
-                        "call_name": url_input.call_name,
-                        "doc_id": doc_id,
-                        "chunk_id": i,
-                        "date": current_date,
-                        "total_chunks": len(chunks)
-                    }
-                }
-            )
-        
-        # Store in Qdrant
-        qdrant_service.upsert_points(points)
+        # Write all changes as one stage task, so a client disconnect
+        # can never leave the document half-updated
+        with step("write"):
+            await stages["qdrant"].run(ingestion_service.apply_update, plan)
         
         return {
             "message": f"Successfully {'updated' if existing_doc_id else 'embedded'} {len(chunks)} chunks from {url_input.url}",
-            "doc_id": doc_id,
+            "doc_id": plan.doc_id,
             "call_name": url_input.call_name,
             "date": current_date,
-            "is_update": existing_doc_id is not None
+            "is_update": existing_doc_id is not None,
+            **plan.counts
         }
+    except (HTTPException, StageSaturatedError):
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
-@app.post("/upload-document", response_model=FileUploadResponse, operation_id="upload_document")
+async def _prepare_url(url_input: URLInput, current_date: str):
+    """Fetch, parse and chunk a URL and plan the incremental update of its document"""
+    url = str(url_input.url)
+
+    # Check if URL already exists
+    with step("lookup"):
+        existing_doc_id = await qdrant_read("get_existing_doc_id", url)
+
+    # Fetch over the pooled client (with authentication if provided), then parse off the event loop
+    with step("fetch"):
+        html = await fetch_service.fetch_html(url, url_input.auth_headers, url_input.basic_auth)
+    with step("parse"):
+        text = await stages["fetch"].run(text_service.extract_text_from_html, html)
+    with step("chunk"):
+        chunks = await stages["extract"].run(text_service.chunk_text, text)
+    CHUNKS_PER_DOCUMENT.observe(len(chunks))
+    
+    # Generate a unique document ID (reuse if updating)
+    doc_id = existing_doc_id if existing_doc_id else str(uuid.uuid4())
+    
+    # Only chunks whose content changed since the last version need embeddings
+    with step("plan"):
+        plan = await stages["qdrant"].run(
+            ingestion_service.plan_update,
+            doc_id,
+            chunks,
+            {
+                "url": url,
+                "call_name": url_input.call_name,
+                "date": current_date,
+                "file_type": "html"
+            },
+            is_update=existing_doc_id is not None
+        )
+    return existing_doc_id, chunks, plan
+
+@app.post("/embed-batch", status_code=202, response_model=JobAccepted, operation_id="embed_documents_batch")
+async def embed_documents_batch(batch_input: BatchURLInput):
+    """
+    Queue several URLs for embedding as one job. Returns a job ID; poll GET /jobs/{job_id}
+    (get_job_status) for the per-URL results.
+    """
+    if len(batch_input.urls) > EMBED_BATCH_MAX_URLS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many URLs: {len(batch_input.urls)} (maximum {EMBED_BATCH_MAX_URLS} per batch)"
+        )
+    redacted = None
+    if any(_has_credentials(url_input) for url_input in batch_input.urls):
+        redacted = batch_input.model_dump(mode="json", exclude={"urls": {"__all__": CREDENTIAL_FIELDS}})
+    return _accepted(await job_service.submit("embed_batch", batch_input.model_dump(mode="json"), redacted_payload=redacted))
+
+async def _run_embed_batch_job(payload: Dict[str, Any], file_path: Optional[str]) -> Dict[str, Any]:
+    return (await _embed_documents_batch(BatchURLInput(**payload))).model_dump()
+
+async def _embed_documents_batch(batch_input: BatchURLInput) -> BatchEmbedResponse:
+
+    current_date = datetime.now().isoformat()
+    results: Dict[int, URLEmbedResult] = {}
+    unique_inputs: Dict[str, int] = {}
+    for i, url_input in enumerate(batch_input.urls):
+        url = str(url_input.url)
+        if url in unique_inputs:
+            results[i] = URLEmbedResult(url=url, call_name=url_input.call_name, success=False,
+                                        error="Duplicate URL in batch")
+        else:
+            unique_inputs[url] = i
+
+    # Fetch and chunk up to EMBED_BATCH_CONCURRENCY pages at a time; one failing URL does not fail the batch
+    limit = asyncio.Semaphore(EMBED_BATCH_CONCURRENCY)
+    prepared = await asyncio.gather(
+        *(_prepare_batch_url(batch_input.urls[i], current_date, limit) for i in unique_inputs.values()),
+        return_exceptions=True
+    )
+
+    plans = []
+    for i, outcome in zip(unique_inputs.values(), prepared):
+        url_input = batch_input.urls[i]
+        if isinstance(outcome, BaseException):
+            results[i] = URLEmbedResult(url=str(url_input.url), call_name=url_input.call_name,
+                                        success=False, error=str(outcome))
+            continue
+        existing_doc_id, chunks, plan = outcome
+        plans.append(plan)
+        results[i] = URLEmbedResult(
+            url=str(url_input.url),
+            call_name=url_input.call_name,
+            success=True,
+            doc_id=plan.doc_id,
+            is_update=existing_doc_id is not None,
+            chunks=len(chunks),
+            **plan.counts
+        )
+
+    try:
+        # One embedding call and one bulk write for the changed chunks of every page
+        texts = [text for plan in plans for text in plan.texts_to_encode]
+        job_service.report(urls=len(batch_input.urls), urls_prepared=len(plans), chunks_to_encode=len(texts))
+        if texts:
+            embeddings = await _encode_documents(texts)
+            offset = 0
+            for plan in plans:
+                count = len(plan.new_indices)
+                ingestion_service.set_embeddings(plan, embeddings[offset:offset + count])
+                offset += count
+        if plans:
+            with step("write"):
+                await stages["qdrant"].run(ingestion_service.apply_updates, plans)
+    except StageSaturatedError:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+    ordered = [results[i] for i in range(len(batch_input.urls))]
+    succeeded = sum(1 for result in ordered if result.success)
+    return BatchEmbedResponse(
+        message=f"Successfully embedded {succeeded} of {len(ordered)} URLs",
+        date=current_date,
+        results=ordered
+    )
+
+async def _prepare_batch_url(url_input: URLInput, current_date: str, limit: asyncio.Semaphore):
+    """Prepare one URL of a batch, waiting for stage capacity while other work drains"""
+    async with limit:
+        delay = BATCH_RETRY_DELAY_SECONDS
+        for attempt in range(BATCH_SATURATED_RETRIES + 1):
+            try:
+                return await _prepare_url(url_input, current_date)
+            except StageSaturatedError:
+                if attempt == BATCH_SATURATED_RETRIES:
+                    raise
+                await asyncio.sleep(delay)
+                delay *= 2
+
+async def _embed_plan(plan: IngestionPlan):
+    """Generate embeddings for the new or changed chunks of an ingestion plan"""
+    if plan.new_indices:
+        ingestion_service.set_embeddings(plan, await _encode_documents(plan.texts_to_encode))
+
+async def _encode_documents(texts: List[str]) -> List[List[float]]:
+    with step("encode"):
+        return await stages["inference"].run(text_service.generate_embeddings, texts)
+
+@app.post("/upload-document", status_code=202, response_model=JobAccepted, operation_id="upload_document")
 async def upload_document(
     file: UploadFile = File(...),
     call_name: str = Form(...)
 ):
+    """
+    Queue an uploaded file (pdf, docx, txt) for embedding. Returns a job ID; poll
+    GET /jobs/{job_id} (get_job_status) for the result.
+    """
+    # Check file extension
+    file_extension = file.filename.split('.')[-1].lower()
+    if file_extension not in ['pdf', 'docx', 'txt']:
+        raise HTTPException(
+            status_code=400, 
+            detail=f"Unsupported file format: .{file_extension}. Supported formats: pdf, docx, txt"
+        )
+    
+    # Reject oversized uploads before doing any work on them
+    upload_size = _upload_size(file)
+    if upload_size > MAX_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"File too large: {upload_size} bytes. Maximum upload size is {MAX_UPLOAD_BYTES} bytes"
+        )
+    
+    # Keep the file next to the job queue so the job can run after a restart
+    job_id = job_service.new_job_id()
+    spool_path = job_service.spool_path(job_id)
+    await file.seek(0)
+    await asyncio.to_thread(_spool_upload, file.file, spool_path)
     try:
-        # Check file extension
-        file_extension = file.filename.split('.')[-1].lower()
-        if file_extension not in ['pdf', 'docx', 'txt']:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Unsupported file format: .{file_extension}. Supported formats: pdf, docx, txt"
-            )
+        await job_service.submit(
+            "upload",
+            {"call_name": call_name, "file_name": file.filename, "bytes_uploaded": upload_size},
+            job_id=job_id,
+            file_path=spool_path
+        )
+    except JobQueueFullError:
+        os.remove(spool_path)
+        raise
+    return _accepted(job_id)
+
+def _spool_upload(source, path: str) -> None:
+    with open(path, "wb") as f:
+        shutil.copyfileobj(source, f)
+
+async def _run_upload_job(payload: Dict[str, Any], file_path: Optional[str]) -> Dict[str, Any]:
+    response = await _ingest_file(file_path, payload["file_name"], payload["call_name"], payload["bytes_uploaded"])
+    return response.model_dump()
+
+def _chunk_file(file_path: str, filename: str):
+    """
+    Stream a file's pages into the chunker (runs on the extract stage)
+
+    PDFs of at least PDF_PARALLEL_MIN_PAGES pages are extracted in page ranges on the
+    PDF process pool. Returns the chunks, their per-chunk payloads and the number of
+    bytes of extracted text.
+    """
+    extracted = 0
+
+    def counted(segments):
+        nonlocal extracted
+        for page, text in segments:
+            extracted += len(text.encode("utf-8"))
+            yield page, text
+
+    if Path(filename).suffix.lower() == ".pdf":
+        segments = document_service.iter_pdf_segments(file_path, pdf_pool, PDF_PROCESSES)
+        chunks, chunk_payloads = text_service.chunk_document(counted(segments))
+    else:
+        with open(file_path, "rb") as file:
+            chunks, chunk_payloads = text_service.chunk_document(counted(document_service.iter_file_segments(file, filename)))
+    return chunks, chunk_payloads, extracted
+
+def _upload_size(file: UploadFile) -> int:
+    if file.size is not None:
+        return file.size
+    # Fall back to the spooled file's length without reading it
+    file.file.seek(0, 2)
+    size = file.file.tell()
+    file.file.seek(0)
+    return size
+
+async def _ingest_file(file_path: str, filename: str, call_name: str, upload_size: int) -> FileUploadResponse:
+    """Extract, chunk, embed and store a spooled upload"""
+    try:
+        file_extension = filename.split('.')[-1].lower()
         
         # Generate a document ID
         doc_id = str(uuid.uuid4())
         current_date = datetime.now().isoformat()
         
-        # Reset file pointer to the beginning
-        await file.seek(0)
-        
-        # Extract text from the file
-        file_content = await file.read()
-        # Reset file position for reading again
-        await file.seek(0)
-        
         # Create a virtual document URL based on filename
-        virtual_url = f"file://{file.filename}"
+        virtual_url = f"file://{filename}"
         
         # Check if a document with this name already exists
-        existing_doc_id = qdrant_service.get_existing_doc_id(virtual_url)
+        with step("lookup"):
+            existing_doc_id = await qdrant_read("get_existing_doc_id", virtual_url)
         if existing_doc_id:
             doc_id = existing_doc_id
-            qdrant_service.delete_document_chunks(doc_id)
-        
-        # Extract text from the file
-        text = document_service.extract_text_from_file(file.file, file.filename)
         
-        # Process text similar to URL embedding
-        chunks = text_service.chunk_text(text)
-        embeddings = text_service.generate_embeddings(chunks)
-        
-        # Prepare points for Qdrant
-        points = []
-        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-            points.append(
+        # Extract and chunk the file page by page
+        with step("extract"):
+            chunks, chunk_payloads, extracted_bytes = await stages["extract"].run(_chunk_file, file_path, filename)
+        CHUNKS_PER_DOCUMENT.observe(len(chunks))
+        with step("plan"):
+            plan = await stages["qdrant"].run(
+                ingestion_service.plan_update,
+                doc_id,
+                chunks,
                 {
-                    "id": str(uuid.uuid4()),
-                    "vector": embedding,
-                    "payload": {
-                        "text": chunk,
-                        "url": virtual_url,
-                        "call_name": call_name,
-                        "doc_id": doc_id,
-                        "chunk_id": i,
-                        "date": current_date,
-                        "total_chunks": len(chunks),
-                        "file_name": file.filename
-                    }
-                }
+                    "url": virtual_url,
+                    "call_name": call_name,
+                    "date": current_date,
+                    "file_name": filename,
+                    "file_type": file_extension
+                },
+                chunk_payloads,
+                is_update=existing_doc_id is not None
             )
+        embedded_bytes = sum(len(text.encode("utf-8")) for text in plan.texts_to_encode)
+        job_service.report(chunks=len(chunks), chunks_to_encode=len(plan.new_indices))
+        await _embed_plan(plan)
         
-        # Store in Qdrant
-        qdrant_service.upsert_points(points)
+        # Store changes in Qdrant
+        with step("write"):
+            await stages["qdrant"].run(ingestion_service.apply_update, plan)
         
         return FileUploadResponse(
-            message=f"Successfully {'updated' if existing_doc_id else 'embedded'} {len(chunks)} chunks from {file.filename}",
+            message=f"Successfully {'updated' if existing_doc_id else 'embedded'} {len(chunks)} chunks from {filename}",
             doc_id=doc_id,
             call_name=call_name,
             date=current_date,
             is_update=existing_doc_id is not None,
-            file_name=file.filename
+            file_name=filename,
+            bytes_uploaded=upload_size,
+            bytes_extracted=extracted_bytes,
+            bytes_embedded=embedded_bytes,
+            **plan.counts
         )
         
+    except (HTTPException, StageSaturatedError):
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+@app.get("/jobs/{job_id}", response_model=JobStatus, operation_id="get_job_status")
+async def get_job_status(job_id: str):
+    """
+    Status of a queued ingestion job: queued, running (with its current stage and
+    progress), completed (with the ingestion result) or failed (with the error)
+    """
+    job = await job_service.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
 @app.post("/retrieve" , operation_id="retrieve_documents")
-async def retrieve_documents(query_input: QueryInput):
-    # Generate embedding for the query
-    query_embedding = text_service.generate_embeddings([query_input.query])[0]
-    
-    # Search in Qdrant
-    search_results = qdrant_service.search_points(
-        query_vector=query_embedding,
-        limit=query_input.top_k * 4
+async def retrieve_documents(query_input: QueryInput, request: Request):
+    return await cancel_on_disconnect(request, _retrieve_documents(query_input))
+
+async def _retrieve_documents(query_input: QueryInput):
+    # Serve hot queries without touching the model or Qdrant
+    cache_key = (
+        qdrant_service.generation,
+        text_service.query_cache_key(query_input.query),
+        query_input.model_dump_json(exclude={"query"})
     )
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    response = await _search_documents(query_input)
+    result_cache.put(cache_key, response)
+    return response
+
+async def _search_documents(query_input: QueryInput):
+    # Generate embedding for the query (batched with concurrent queries)
+    with step("query_encode"):
+        query_embedding = await query_encoder.encode(query_input.query)
     
     if query_input.group_by_doc:
-        # Group results by document
-        doc_results = {}
-        for hit in search_results.points:
-            doc_id = hit.payload["doc_id"]
-            if doc_id not in doc_results:
-                doc_results[doc_id] = {
-                    "doc_id": doc_id,
-                    "call_name": hit.payload["call_name"],
-                    "url": hit.payload["url"],
-                    "date": hit.payload["date"],
-                    "chunks": [],
-                    "total_chunks": hit.payload["total_chunks"],
-                    "avg_score": 0,
-                    "file_name": hit.payload.get("file_name", None)
-                }
-            
-            doc_results[doc_id]["chunks"].append({
-                "text": hit.payload["text"],
-                "chunk_id": hit.payload["chunk_id"],
-                "score": hit.score
-            })
-            doc_results[doc_id]["avg_score"] += hit.score
-        
-        # Calculate average scores and sort documents
-        for doc_id in doc_results:
-            doc_results[doc_id]["avg_score"] /= len(doc_results[doc_id]["chunks"])
-            doc_results[doc_id]["chunks"].sort(key=lambda x: x["chunk_id"])
+        # Qdrant groups hits by document: exactly top_k documents, no over-fetch
+        with step("search"):
+            groups = await qdrant_read(
+                "search_groups",
+                query_vector=query_embedding,
+                limit=query_input.top_k,
+                group_size=query_input.group_size or SEARCH_GROUP_SIZE,
+                filters=query_input.filters
+            )
         
-        results = list(doc_results.values())
-        results.sort(key=lambda x: x["avg_score"], reverse=True)
-        return {"results": results}
+        return {"results": format_grouped_results(groups)}
     else:
         # Return individual chunks without grouping
-        results = []
-        for hit in search_results.points:
-            results.append({
-                "text": hit.payload["text"],
-                "url": hit.payload["url"],
-                "call_name": hit.payload["call_name"],
-                "doc_id": hit.payload["doc_id"],
-                "chunk_id": hit.payload["chunk_id"],
-                "date": hit.payload["date"],
-                "score": hit.score,
-                "file_name": hit.payload.get("file_name", None)
-            })
-        
-        results.sort(key=lambda x: x["score"], reverse=True)
-        return {"results": results}
+        with step("search"):
+            search_results = await qdrant_read(
+                "search_points",
+                query_vector=query_embedding,
+                limit=query_input.top_k * 4,
+                filters=query_input.filters
+            )
+        return {"results": format_chunk_results(search_results)}
+
+@app.get("/healthz", include_in_schema=False)
+async def healthz():
+    """Liveness: the process is up and serving requests"""
+    return {"status": "ok"}
+
+@app.get("/readyz", include_in_schema=False)
+async def readyz():
+    """Readiness: startup finished and Qdrant answers"""
+    if not ready:
+        return JSONResponse(status_code=503, content={"status": "not ready"})
+    try:
+        if async_qdrant_service is not None:
+            await asyncio.wait_for(async_qdrant_service.ping(), timeout=2)
+        else:
+            await asyncio.wait_for(asyncio.to_thread(qdrant_service.ping), timeout=2)
+    except Exception as e:
+        return JSONResponse(status_code=503, content={"status": "not ready", "detail": f"Qdrant unavailable: {e}"})
+    return {"status": "ready", "startup_seconds": startup_timings}
+
+# Plain def: collecting runs job and embedding store queries, so it goes to the threadpool
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/cache/stats")
+def get_cache_stats():
+    return {
+        "query_embeddings": text_service.query_cache.stats(),
+        "retrieve_results": result_cache.stats(),
+        "doc_ids": qdrant_service.doc_id_cache.stats(),
+        "embedding_store": text_service.embedding_store.stats() if text_service.embedding_store else None
+    }
 
 # Mount MCP routes
 mcp = FastApiMCP(
     app,
     name="contextmore api mcp",
     description="ContextMore is a tool that allows you to embed documents and search them using a vector database. It is designed to be used in conjunction with the ContextMore MCP server.",
-    include_operations=["embed_document", "upload_document", "retrieve_documents"],
+    include_operations=["embed_document", "embed_documents_batch", "upload_document", "get_job_status",
+                        "retrieve_documents"],
     include_tags=["embed", "retrieve", "contextmore"]
 )
 mcp.mount() 
\ No newline at end of file
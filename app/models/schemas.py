@@ -1,5 +1,6 @@
-from typing import Dict, Optional
-from pydantic import BaseModel, HttpUrl
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel, Field, HttpUrl
 
 class AuthHeaders(BaseModel):
     """Custom headers for authentication"""
@@ -17,6 +18,29 @@ class URLInput(BaseModel):
     auth_headers: Optional[AuthHeaders] = None
     basic_auth: Optional[BasicAuth] = None
 
+class BatchURLInput(BaseModel):
+    """Input model for embedding several URLs in one request"""
+    urls: List[URLInput]
+
+class URLEmbedResult(BaseModel):
+    """Outcome of embedding one URL of a batch"""
+    url: str
+    call_name: str
+    success: bool
+    doc_id: Optional[str] = None
+    is_update: bool = False
+    chunks: int = 0
+    chunks_reused: int = 0
+    chunks_added: int = 0
+    chunks_removed: int = 0
+    error: Optional[str] = None
+
+class BatchEmbedResponse(BaseModel):
+    """Response model for batch URL embedding"""
+    message: str
+    date: str
+    results: List[URLEmbedResult]
+
 class FileUploadResponse(BaseModel):
     """Response model for file upload"""
     message: str
@@ -25,9 +49,50 @@ class FileUploadResponse(BaseModel):
     date: str
     is_update: bool
     file_name: str
+    chunks_reused: int = 0
+    chunks_added: int = 0
+    chunks_removed: int = 0
+    bytes_uploaded: int = 0
+    bytes_extracted: int = 0
+    bytes_embedded: int = 0
+
+class JobAccepted(BaseModel):
+    """Response model for a queued ingestion job"""
+    job_id: str
+    status: str
+    status_url: str
+
+class JobStatus(BaseModel):
+    """State of an ingestion job"""
+    job_id: str
+    kind: str
+    status: str  # queued, running, completed or failed
+    stage: Optional[str] = None
+    # Chunk counts and seconds spent in each finished stage
+    progress: Dict[str, Any] = {}
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    # Times the job was started (retries after a saturated stage or a restart included)
+    attempts: int = 0
+    created_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+
+class SearchFilters(BaseModel):
+    """Restrict retrieval to matching documents (all given conditions must hold)"""
+    call_names: Optional[List[str]] = None
+    doc_ids: Optional[List[str]] = None
+    file_types: Optional[List[str]] = None
+    date_from: Optional[datetime] = None
+    date_to: Optional[datetime] = None
+    # Metadata written with `upload_documents.py --tag key=value`
+    tags: Optional[Dict[str, str]] = None
 
 class QueryInput(BaseModel):
     """Input model for document retrieval"""
     query: str
     top_k: int = 5
-    group_by_doc: bool = True 
\ No newline at end of file
+    group_by_doc: bool = True
+    # Chunks per document when grouping (defaults to SEARCH_GROUP_SIZE)
+    group_size: Optional[int] = Field(default=None, ge=1)
+    filters: Optional[SearchFilters] = None 
\ No newline at end of file
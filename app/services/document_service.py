@@ -1,46 +1,139 @@
-import os
-import tempfile
+import io
+import mmap
+from collections import deque
+from concurrent.futures import Executor
+from contextlib import contextmanager
 from pathlib import Path
-from typing import BinaryIO, List, Optional
+from typing import BinaryIO, Iterator, List, Optional, Tuple
 
 import PyPDF2
 from docx import Document as DocxDocument
 
+from app.config.settings import PDF_PAGES_PER_TASK, PDF_PARALLEL_MIN_PAGES
+
+
+# (page number or None, text) pieces of a document, in reading order
+Segment = Tuple[Optional[int], str]
+
+
+def _fileno(file: BinaryIO) -> Optional[int]:
+    """
+    OS file descriptor behind a file object, or None when its data only lives in memory
+
+    Uploads reach the extractors as the job's spool file on disk. Don't pass a
+    SpooledTemporaryFile: fileno() would force it out to disk.
+    """
+    try:
+        return file.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return None
+
+
+@contextmanager
+def _pdf_source(file: BinaryIO):
+    """
+    Memory-map a file-backed PDF so PyPDF2 reads it without copying into Python buffers
+
+    In-memory files (and anything that can't be mapped) are used as they are.
+    """
+    fileno = _fileno(file)
+    try:
+        mapped = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ) if fileno is not None else None
+    except (OSError, ValueError):
+        mapped = None
+
+    if mapped is None:
+        yield file
+        return
+    try:
+        yield mapped
+    finally:
+        mapped.close()
+
+
+def extract_pdf_page_range(path: str, start: int, end: int) -> List[str]:
+    """Extract the text of pages [start, end) of a PDF file (runs in worker processes)"""
+    try:
+        with open(path, 'rb') as file, _pdf_source(file) as source:
+            pdf_reader = PyPDF2.PdfReader(source)
+            return [pdf_reader.pages[page_num].extract_text() for page_num in range(start, end)]
+    except Exception as e:
+        raise ValueError(f"Error extracting text from PDF: {str(e)}")
+
 
 class DocumentService:
     """Service for extracting text from various document formats"""
     
     @staticmethod
-    def extract_text_from_pdf(file: BinaryIO) -> str:
-        """Extract text content from a PDF file"""
-        text = ""
+    def iter_pdf_pages(file: BinaryIO) -> Iterator[str]:
+        """Yield the text of each page of a PDF file, one page at a time"""
         try:
-            pdf_reader = PyPDF2.PdfReader(file)
-            for page_num in range(len(pdf_reader.pages)):
-                page = pdf_reader.pages[page_num]
-                text += page.extract_text() + "\n\n"
-            return text.strip()
+            with _pdf_source(file) as source:
+                pdf_reader = PyPDF2.PdfReader(source)
+                for page in pdf_reader.pages:
+                    yield page.extract_text()
         except Exception as e:
             raise ValueError(f"Error extracting text from PDF: {str(e)}")
+
+    @staticmethod
+    def count_pdf_pages(path: str) -> int:
+        try:
+            with open(path, 'rb') as file, _pdf_source(file) as source:
+                return len(PyPDF2.PdfReader(source).pages)
+        except Exception as e:
+            raise ValueError(f"Error extracting text from PDF: {str(e)}")
+
+    @classmethod
+    def iter_pdf_pages_parallel(cls, path: str, executor: Executor, workers: int,
+                                pages_per_task: int = PDF_PAGES_PER_TASK) -> Iterator[str]:
+        """
+        Yield the text of each page of a PDF file, extracting page ranges in a process pool
+
+        Pages come out in order; only two ranges per worker (`workers` is the size of
+        the pool) are in flight, so memory stays bounded for very large files.
+        """
+        page_count = cls.count_pdf_pages(path)
+        ranges = deque((start, min(start + pages_per_task, page_count))
+                       for start in range(0, page_count, pages_per_task))
+        window = max(1, workers) * 2
+
+        in_flight = deque()
+        while ranges or in_flight:
+            while ranges and len(in_flight) < window:
+                start, end = ranges.popleft()
+                in_flight.append(executor.submit(extract_pdf_page_range, path, start, end))
+            yield from in_flight.popleft().result()
+
+    @classmethod
+    def iter_pdf_segments(cls, path: str, executor: Optional[Executor] = None, workers: int = 1,
+                          min_pages: int = PDF_PARALLEL_MIN_PAGES) -> Iterator[Segment]:
+        """
+        Yield (page number, text) for each page of a PDF file on disk
+
+        With an executor, files of at least `min_pages` pages go through
+        iter_pdf_pages_parallel; smaller files are read in this process.
+        """
+        if executor is not None and cls.count_pdf_pages(path) >= min_pages:
+            yield from enumerate(cls.iter_pdf_pages_parallel(path, executor, workers), start=1)
+        else:
+            with open(path, 'rb') as file:
+                yield from enumerate(cls.iter_pdf_pages(file), start=1)
+
+    @classmethod
+    def extract_text_from_pdf(cls, file: BinaryIO) -> str:
+        """Extract text content from a PDF file"""
+        return "\n\n".join(cls.iter_pdf_pages(file)).strip()
     
     @staticmethod
     def extract_text_from_docx(file: BinaryIO) -> str:
         """Extract text content from a DOCX file"""
         try:
-            # Create a temporary file to save the uploaded content
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.docx') as temp_file:
-                temp_file.write(file.read())
-                temp_path = temp_file.name
-            
-            # Process the document
-            doc = DocxDocument(temp_path)
+            # python-docx reads the zip archive straight from the (seekable) file object
+            doc = DocxDocument(file)
             full_text = []
             for para in doc.paragraphs:
                 full_text.append(para.text)
             
-            # Clean up the temp file
-            os.unlink(temp_path)
-            
             return "\n".join(full_text)
         except Exception as e:
             raise ValueError(f"Error extracting text from DOCX: {str(e)}")
@@ -56,6 +149,22 @@ class DocumentService:
         except Exception as e:
             raise ValueError(f"Error extracting text from TXT: {str(e)}")
     
+    @classmethod
+    def iter_file_segments(cls, file: BinaryIO, filename: str) -> Iterator[Segment]:
+        """
+        Yield (page number, text) segments of a file based on its extension
+
+        PDFs are streamed page by page with 1-based page numbers; other formats
+        have no pages and produce a single segment with page None.
+        """
+        file_extension = Path(filename).suffix.lower()
+
+        if file_extension == '.pdf':
+            for page_num, text in enumerate(cls.iter_pdf_pages(file), start=1):
+                yield page_num, text
+        else:
+            yield None, cls.extract_text_from_file(file, filename)
+
     @classmethod
     def extract_text_from_file(cls, file: BinaryIO, filename: str) -> str:
         """Extract text from a file based on its extension"""
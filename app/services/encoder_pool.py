@@ -0,0 +1,74 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterator, List, Optional
+
+import numpy as np
+
+from app.config.settings import MODEL_BACKEND, MODEL_NAME
+from app.services.model_loader import load_model
+
+# Model replica of the current worker process, loaded by _init_worker
+_worker_model = None
+# Barrier shared by all workers of the pool, used by EncoderPool.start()
+_ready_barrier = None
+
+
+def _init_worker(backend: str, threads: int, model_factory: Optional[Callable], ready_barrier) -> None:
+    global _worker_model, _ready_barrier
+    _ready_barrier = ready_barrier
+    if model_factory is not None:
+        _worker_model = model_factory()
+    else:
+        _worker_model = load_model(MODEL_NAME, backend, intra_op_threads=threads, inter_op_threads=1)
+
+
+def _worker_ready() -> int:
+    # Hold this worker until every worker has taken one of these tasks, so each of them
+    # runs exactly one and no fast worker can take another worker's share
+    _ready_barrier.wait()
+    return os.getpid()
+
+
+def _encode(texts: List[str]) -> np.ndarray:
+    return _worker_model.encode(texts, batch_size=len(texts))
+
+
+class EncoderPool:
+    """
+    Model replicas in worker processes, for bulk encoding on many cores
+
+    Each of `processes` spawned workers loads its own copy of the model and runs it
+    with `threads_per_process` intra-op threads. Batches are queued on the pool and
+    taken by whichever worker is idle, so workers that draw short batches simply
+    take more of them.
+    """
+
+    def __init__(self, processes: int, threads_per_process: int = 0, backend: str = MODEL_BACKEND,
+                 model_factory: Optional[Callable] = None):
+        self.processes = max(1, processes)
+        self.threads_per_process = threads_per_process or max(1, (os.cpu_count() or 1) // self.processes)
+        # Spawned, not forked: a forked copy of a process that already runs torch threads is not safe
+        context = multiprocessing.get_context("spawn")
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(backend, self.threads_per_process, model_factory, context.Barrier(self.processes))
+        )
+
+    def start(self) -> None:
+        """Start every worker and wait until each has loaded its model"""
+        # The tasks only return once all workers have initialized (and so loaded their model)
+        futures = [self._executor.submit(_worker_ready) for _ in range(self.processes)]
+        pids = {future.result() for future in futures}
+        if len(pids) != self.processes:
+            raise RuntimeError(f"Only {len(pids)} of {self.processes} encoder processes started")
+
+    def encode_batches(self, batches: List[List[str]]) -> Iterator[np.ndarray]:
+        """Encode batches of texts in parallel; yields one array per batch, in order"""
+        return self._executor.map(_encode, batches)
+
+    def shutdown(self) -> None:
+        """Stop the workers, dropping batches that have not started"""
+        self._executor.shutdown(wait=True, cancel_futures=True)
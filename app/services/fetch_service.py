@@ -0,0 +1,60 @@
+import asyncio
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.models.schemas import AuthHeaders, BasicAuth
+
+
+class FetchService:
+    """
+    Async URL fetching over one pooled HTTP client
+
+    Connections (and TLS sessions) are reused across requests, the total number of
+    connections is capped, and each host gets at most `max_per_host` concurrent requests.
+    """
+
+    def __init__(self, max_connections: int, max_per_host: int, timeout: float):
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                ),
+                timeout=httpx.Timeout(self.timeout),
+                follow_redirects=True
+            )
+        return self._client
+
+    async def fetch_html(self, url: str, auth_headers: Optional[AuthHeaders] = None,
+                         basic_auth: Optional[BasicAuth] = None) -> str:
+        """
+        Download a page with optional authentication and return its body
+        """
+        host = urlsplit(url).netloc
+        host_limit = self._host_limits.setdefault(host, asyncio.Semaphore(self.max_per_host))
+
+        headers = dict(auth_headers.headers) if auth_headers else {}
+        auth = (basic_auth.username, basic_auth.password) if basic_auth else None
+
+        try:
+            async with host_limit:
+                response = await self.client.get(url, headers=headers, auth=auth)
+            response.raise_for_status()
+            return response.text
+        except httpx.HTTPError as e:
+            raise ValueError(f"Error fetching URL: {str(e)}")
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,173 @@
+import hashlib
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.qdrant_service import QdrantService
+from app.services.text_service import TextService
+
+# Namespace for deterministic chunk point IDs
+CHUNK_ID_NAMESPACE = uuid.UUID("6f1c1d2e-8a4b-4f0e-9a57-0c2f3d7b5e91")
+
+
+@dataclass
+class IngestionPlan:
+    """Changes needed to bring a stored document in line with its current chunks"""
+    doc_id: str
+    points: List[Dict[str, Any]]
+    new_indices: List[int]
+    reused_ids: List[str]
+    removed_ids: List[str]
+    embeddings: Dict[int, List[float]] = field(default_factory=dict)
+    # Document-wide fields to set on all reused points, or None when they are all current
+    document_update: Optional[Dict[str, Any]] = None
+    # Per-chunk fields (chunk_id, pages, ...) that changed, and fields that no longer apply, by point ID
+    chunk_updates: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    stale_fields: Dict[str, List[str]] = field(default_factory=dict)
+
+    @property
+    def texts_to_encode(self) -> List[str]:
+        return [self.points[i]["payload"]["text"] for i in self.new_indices]
+
+    @property
+    def counts(self) -> Dict[str, int]:
+        return {
+            "chunks_reused": len(self.reused_ids),
+            "chunks_added": len(self.new_indices),
+            "chunks_removed": len(self.removed_ids)
+        }
+
+
+class IngestionService:
+    """
+    Incremental indexing of document chunks
+
+    Every chunk gets a point ID derived from (doc_id, chunk text hash), so re-submitting
+    a document only encodes and upserts chunks whose text changed; unchanged chunks keep
+    their vectors and text and only get the payload fields that changed, and chunks that
+    disappeared are deleted.
+    """
+
+    def __init__(self, text_service: TextService, qdrant_service: QdrantService):
+        self.text_service = text_service
+        self.qdrant_service = qdrant_service
+
+    @staticmethod
+    def chunk_hash(chunk: str) -> str:
+        return hashlib.sha256(chunk.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def chunk_point_id(doc_id: str, chunk_hash: str, occurrence: int) -> str:
+        """Deterministic point ID; `occurrence` tells apart identical chunks within a document"""
+        return str(uuid.uuid5(CHUNK_ID_NAMESPACE, f"{doc_id}:{chunk_hash}:{occurrence}"))
+
+    def plan_update(self, doc_id: str, chunks: List[str], payload: Dict[str, Any],
+                    chunk_payloads: Optional[List[Dict[str, Any]]] = None,
+                    is_update: bool = True) -> IngestionPlan:
+        """
+        Work out which chunks must be encoded, which can be kept and which must be removed
+
+        `payload` is shared by all chunks, `chunk_payloads` adds per-chunk fields.
+        Pass is_update=False for new documents to skip the lookup of stored points.
+        """
+        stored = self.qdrant_service.get_document_payloads(doc_id) if is_update else {}
+        document_fields = {**payload, "total_chunks": len(chunks)}
+
+        points = []
+        new_indices = []
+        reused_ids = []
+        chunk_updates: Dict[str, Dict[str, Any]] = {}
+        stale_fields: Dict[str, List[str]] = {}
+        occurrences: Dict[str, int] = {}
+        for i, chunk in enumerate(chunks):
+            chunk_hash = self.chunk_hash(chunk)
+            occurrence = occurrences.get(chunk_hash, 0)
+            occurrences[chunk_hash] = occurrence + 1
+            point_id = self.chunk_point_id(doc_id, chunk_hash, occurrence)
+
+            points.append({
+                "id": point_id,
+                "payload": {
+                    **payload,
+                    **(chunk_payloads[i] if chunk_payloads else {}),
+                    "text": chunk,
+                    "doc_id": doc_id,
+                    "chunk_id": i,
+                    "total_chunks": len(chunks),
+                    "chunk_hash": chunk_hash
+                }
+            })
+            if point_id not in stored:
+                new_indices.append(i)
+                continue
+
+            # A reused chunk has the same text, hash and doc_id; only write what differs
+            reused_ids.append(point_id)
+            current = stored[point_id]
+            new_payload = points[-1]["payload"]
+            changed = {
+                key: value for key, value in new_payload.items()
+                if key != "text" and key not in document_fields and current.get(key) != value
+            }
+            if changed:
+                chunk_updates[point_id] = changed
+            stale = [key for key in current if key not in new_payload]
+            if stale:
+                stale_fields[point_id] = stale
+
+        kept_ids = {point["id"] for point in points}
+        removed_ids = [point_id for point_id in stored if point_id not in kept_ids]
+        document_update = None
+        if any(stored[point_id].get(key) != value for point_id in reused_ids for key, value in document_fields.items()):
+            document_update = document_fields
+        return IngestionPlan(
+            doc_id, points, new_indices, reused_ids, removed_ids,
+            document_update=document_update, chunk_updates=chunk_updates, stale_fields=stale_fields
+        )
+
+    def set_embeddings(self, plan: IngestionPlan, embeddings: List[List[float]]) -> None:
+        """Attach embeddings, in the order of plan.texts_to_encode"""
+        plan.embeddings = dict(zip(plan.new_indices, embeddings))
+
+    def apply_update(self, plan: IngestionPlan, wait: bool = True) -> None:
+        """
+        Write new chunks, update the changed payload fields of kept chunks and delete removed chunks
+
+        With wait=False writes are only acknowledged; call QdrantService.flush() before reading them.
+        """
+        self.apply_updates([plan], wait=wait)
+
+    def apply_updates(self, plans: List[IngestionPlan], wait: bool = True) -> None:
+        """
+        Apply the plans of several documents through one batched write
+
+        Kept chunks get one payload operation per document for the document-wide fields,
+        plus one per chunk whose own fields (position, pages) changed.
+        """
+        upserts = []
+        payload_updates: List[Tuple[Dict[str, Any], List[str]]] = []
+        stale: Dict[Tuple[str, ...], List[str]] = {}
+        removed_ids = []
+        for plan in plans:
+            upserts.extend(
+                {**plan.points[i], "vector": plan.embeddings[i]}
+                for i in plan.new_indices
+            )
+            if plan.document_update is not None:
+                payload_updates.append((plan.document_update, plan.reused_ids))
+            payload_updates.extend((fields, [point_id]) for point_id, fields in plan.chunk_updates.items())
+            for point_id, keys in plan.stale_fields.items():
+                stale.setdefault(tuple(sorted(keys)), []).append(point_id)
+            removed_ids.extend(plan.removed_ids)
+        payload_deletes = [(list(keys), point_ids) for keys, point_ids in stale.items()]
+        self.qdrant_service.apply_document_update(upserts, payload_updates, payload_deletes, removed_ids, wait=wait)
+
+    def index_document(self, doc_id: str, chunks: List[str], payload: Dict[str, Any],
+                       chunk_payloads: Optional[List[Dict[str, Any]]] = None,
+                       is_update: bool = True, wait: bool = True) -> IngestionPlan:
+        """Plan, encode and apply an incremental update in one call"""
+        plan = self.plan_update(doc_id, chunks, payload, chunk_payloads, is_update)
+        if plan.new_indices:
+            self.set_embeddings(plan, self.text_service.generate_embeddings(plan.texts_to_encode))
+        self.apply_update(plan, wait=wait)
+        return plan
@@ -0,0 +1,331 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, Type
+
+from app.utils.metrics import JOB_SECONDS, JOBS_QUEUED
+
+# Seconds an idle worker waits before checking the queue again (submissions wake it at once)
+IDLE_POLL_SECONDS = 1.0
+# Seconds before a job that hit a saturated stage is retried, doubling with every attempt
+RETRY_DELAY_SECONDS = 1.0
+MAX_RETRY_DELAY_SECONDS = 60.0
+
+
+def _remove_files(paths: Iterable[Optional[str]]) -> None:
+    """Delete spool files, skipping jobs without one and files already gone"""
+    for path in paths:
+        if path:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class JobQueueFullError(Exception):
+    """Raised when the queue already holds its maximum number of waiting jobs"""
+
+    def __init__(self, max_queued: int):
+        super().__init__(f"The ingestion queue is full ({max_queued} jobs waiting), retry later")
+
+
+class JobService:
+    """
+    Persistent queue of ingestion jobs, run by a fixed number of async workers
+
+    Jobs are rows in an SQLite database (WAL mode) under `path`, and uploaded files are
+    spooled next to it, so queued work survives a restart; jobs that were running when
+    the process stopped are queued again on startup (ingestion is idempotent). Handlers
+    report their current stage and progress through stage() and report(), which find
+    the job of the calling task through a context variable.
+
+    A job can be submitted with a redacted copy of its payload (e.g. without credentials):
+    only that copy is written to disk, and the full payload is kept in memory until the
+    job finishes. Such a job fails if a restart loses it before it ran.
+
+    All database work runs on one dedicated thread that owns the connection, so it never
+    blocks the event loop; stage updates from report() are written there without waiting.
+    """
+
+    def __init__(self, path: str, max_queued: int, retention_seconds: float, max_attempts: int):
+        self.path = path
+        self.files_dir = os.path.join(path, "files")
+        # Spooled uploads and job results are private to the service's user, including
+        # directories created by an older version with the default mode
+        for directory in (path, self.files_dir):
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+            os.chmod(directory, 0o700)
+        self.max_queued = max_queued
+        self.retention_seconds = retention_seconds
+        self.max_attempts = max(1, max_attempts)
+        self._db_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-db")
+        self._db: Optional[sqlite3.Connection] = None
+        self._current: ContextVar[Optional[str]] = ContextVar("current_job", default=None)
+        self._progress: Dict[str, Dict[str, Any]] = {}
+        # Full payloads of jobs stored redacted, by job ID
+        self._payloads: Dict[str, Dict[str, Any]] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._workers: List[asyncio.Task] = []
+        self._db_thread.submit(self._open).result()
+        JOBS_QUEUED.set_function(self.queued_count)
+
+    def _open(self) -> None:
+        db_path = os.path.join(self.path, "jobs.sqlite")
+        # SQLite gives the -wal and -shm files the permissions of the database file
+        os.close(os.open(db_path, os.O_CREAT | os.O_WRONLY, 0o600))
+        for file_path in (db_path, db_path + "-wal", db_path + "-shm"):
+            if os.path.exists(file_path):
+                os.chmod(file_path, 0o600)
+        self._db = sqlite3.connect(db_path, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, stage TEXT, "
+                "payload TEXT NOT NULL, file_path TEXT, progress TEXT NOT NULL DEFAULT '{}', "
+                "result TEXT, error TEXT, created_at TEXT NOT NULL, started_at TEXT, finished_at TEXT, "
+                "created REAL NOT NULL, finished REAL, attempts INTEGER NOT NULL DEFAULT 0, "
+                "not_before REAL NOT NULL DEFAULT 0, redacted INTEGER NOT NULL DEFAULT 0)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, created)")
+            # Jobs interrupted by a shutdown or crash start over, unless they keep taking the process down
+            given_up = self._db.execute(
+                "SELECT file_path FROM jobs WHERE status = 'running' AND attempts >= ?", (self.max_attempts,)
+            ).fetchall()
+            failed = self._db.execute(
+                "UPDATE jobs SET status = 'failed', stage = NULL, error = ?, finished_at = ?, finished = ? "
+                "WHERE status = 'running' AND attempts >= ?",
+                (f"Interrupted {self.max_attempts} times", datetime.now().isoformat(), time.time(), self.max_attempts)
+            ).rowcount
+            recovered = self._db.execute(
+                "UPDATE jobs SET status = 'queued', stage = NULL, progress = '{}', started_at = NULL "
+                "WHERE status = 'running'"
+            ).rowcount
+        _remove_files(file_path for file_path, in given_up)
+        if recovered:
+            print(f"Re-queued {recovered} interrupted ingestion jobs")
+        if failed:
+            print(f"Failed {failed} ingestion jobs interrupted {self.max_attempts} times")
+
+    async def _call(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Run a database function on the database thread"""
+        return await asyncio.get_running_loop().run_in_executor(self._db_thread, func, *args)
+
+    def _count_queued(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+    def queued_count(self) -> int:
+        """Number of waiting jobs (blocks on the database thread; never call it from the event loop)"""
+        return self._db_thread.submit(self._count_queued).result()
+
+    def spool_path(self, job_id: str) -> str:
+        return os.path.join(self.files_dir, job_id)
+
+    def new_job_id(self) -> str:
+        return str(uuid.uuid4())
+
+    def _insert(self, job_id: str, kind: str, payload: str, file_path: Optional[str], redacted: bool) -> None:
+        with self._db:
+            if self._count_queued() >= self.max_queued:
+                raise JobQueueFullError(self.max_queued)
+            self._db.execute(
+                "INSERT INTO jobs (id, kind, status, payload, file_path, created_at, created, redacted) "
+                "VALUES (?, ?, 'queued', ?, ?, ?, ?, ?)",
+                (job_id, kind, payload, file_path, datetime.now().isoformat(), time.time(), int(redacted))
+            )
+
+    async def submit(self, kind: str, payload: Dict[str, Any], job_id: Optional[str] = None,
+                     file_path: Optional[str] = None, redacted_payload: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Queue a job and return its ID; raises JobQueueFullError when the queue is full
+
+        With `redacted_payload`, that is what gets stored and `payload` is only kept in memory.
+        """
+        job_id = job_id or self.new_job_id()
+        redacted = redacted_payload is not None
+        if redacted:
+            self._payloads[job_id] = payload
+        try:
+            await self._call(self._insert, job_id, kind, json.dumps(redacted_payload if redacted else payload),
+                             file_path, redacted)
+        except JobQueueFullError:
+            self._payloads.pop(job_id, None)
+            raise
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job_id
+
+    def _select(self, job_id: str) -> Optional[Tuple]:
+        return self._db.execute(
+            "SELECT id, kind, status, stage, progress, result, error, attempts, created_at, started_at, finished_at "
+            "FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = await self._call(self._select, job_id)
+        if row is None:
+            return None
+        job_id, kind, status, stage, progress, result, error, attempts, created_at, started_at, finished_at = row
+        return {
+            "job_id": job_id,
+            "kind": kind,
+            "status": status,
+            "stage": stage,
+            # Progress of a running job is kept in memory and written at stage boundaries
+            "progress": self._progress.get(job_id) or json.loads(progress),
+            "result": json.loads(result) if result else None,
+            "error": error,
+            "attempts": attempts,
+            "created_at": created_at,
+            "started_at": started_at,
+            "finished_at": finished_at
+        }
+
+    def _claim(self) -> Optional[Tuple[str, str, Dict[str, Any], Optional[str], int, bool]]:
+        """
+        Mark the oldest queued job that is due as running and return
+        (id, kind, stored payload, file path, attempt number, whether the payload is redacted)
+        """
+        with self._db:
+            row = self._db.execute(
+                "SELECT id, kind, payload, file_path, attempts, redacted FROM jobs "
+                "WHERE status = 'queued' AND not_before <= ? ORDER BY created LIMIT 1",
+                (time.time(),)
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute(
+                "UPDATE jobs SET status = 'running', started_at = ?, attempts = attempts + 1 WHERE id = ?",
+                (datetime.now().isoformat(), row[0])
+            )
+        return row[0], row[1], json.loads(row[2]), row[3], row[4] + 1, bool(row[5])
+
+    def _requeue(self, job_id: str, delay: float) -> None:
+        with self._db:
+            self._db.execute(
+                "UPDATE jobs SET status = 'queued', stage = NULL, progress = '{}', started_at = NULL, "
+                "not_before = ? WHERE id = ?",
+                (time.time() + delay, job_id)
+            )
+
+    def _finish(self, job_id: str, progress: str, result: Optional[str], error: Optional[str]) -> None:
+        with self._db:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, stage = NULL, progress = ?, result = ?, error = ?, "
+                "finished_at = ?, finished = ? WHERE id = ?",
+                (
+                    "failed" if error is not None else "completed", progress, result, error,
+                    datetime.now().isoformat(), time.time(), job_id
+                )
+            )
+
+    def _purge(self) -> None:
+        """Forget finished jobs older than the retention period, with any spool files left behind"""
+        cutoff = time.time() - self.retention_seconds
+        with self._db:
+            expired = self._db.execute(
+                "SELECT file_path FROM jobs WHERE finished IS NOT NULL AND finished < ?", (cutoff,)
+            ).fetchall()
+            self._db.execute("DELETE FROM jobs WHERE finished IS NOT NULL AND finished < ?", (cutoff,))
+        _remove_files(file_path for file_path, in expired)
+
+    def report(self, stage: Optional[str] = None, **progress: Any) -> None:
+        """Record the current stage and/or progress counters of the calling task's job, if any"""
+        job_id = self._current.get()
+        if job_id is None:
+            return
+        self._progress.setdefault(job_id, {}).update(progress)
+        if stage is not None:
+            # Queued behind earlier writes on the database thread; the caller doesn't wait
+            self._db_thread.submit(self._write_stage, job_id, stage, json.dumps(self._progress[job_id]))
+
+    def _write_stage(self, job_id: str, stage: str, progress: str) -> None:
+        with self._db:
+            self._db.execute("UPDATE jobs SET stage = ?, progress = ? WHERE id = ?", (stage, progress, job_id))
+
+    @contextmanager
+    def stage(self, name: str):
+        """Mark a stage of the calling task's job as current and record its duration"""
+        job_id = self._current.get()
+        if job_id is None:
+            yield
+            return
+        self.report(stage=name)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            stages = self._progress.setdefault(job_id, {}).setdefault("stage_seconds", {})
+            stages[name] = stages.get(name, 0.0) + time.perf_counter() - started
+
+    async def _run(self, handlers: Dict[str, Callable[[Dict[str, Any], Optional[str]], Awaitable[Dict[str, Any]]]],
+                   retry_on: Tuple[Type[BaseException], ...]) -> None:
+        while True:
+            job = await self._call(self._claim)
+            if job is None:
+                await self._call(self._purge)
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), IDLE_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            job_id, kind, payload, file_path, attempt, redacted = job
+            if redacted:
+                payload = self._payloads.get(job_id)
+            token = self._current.set(job_id)
+            started = time.perf_counter()
+            result, error = None, None
+            try:
+                if payload is None:
+                    raise ValueError("The job's credentials were not kept across a restart; submit it again")
+                result = await handlers[kind](payload, file_path)
+            except retry_on as e:
+                if attempt < self.max_attempts:
+                    # Other jobs run while this one waits out its backoff
+                    self._progress.pop(job_id, None)
+                    delay = min(RETRY_DELAY_SECONDS * 2 ** (attempt - 1), MAX_RETRY_DELAY_SECONDS)
+                    await self._call(self._requeue, job_id, delay)
+                    continue
+                error = f"Gave up after {attempt} attempts: {e}"
+            except Exception as e:
+                error = str(getattr(e, "detail", None) or e)
+            finally:
+                self._current.reset(token)
+
+            self._payloads.pop(job_id, None)
+            progress = json.dumps(self._progress.pop(job_id, {}))
+            await self._call(self._finish, job_id, progress, json.dumps(result) if result is not None else None, error)
+            JOB_SECONDS.labels(kind, "failed" if error is not None else "completed").observe(time.perf_counter() - started)
+            _remove_files([file_path])
+
+    def start(self, workers: int, handlers: Dict[str, Callable[[Dict[str, Any], Optional[str]], Awaitable[Dict[str, Any]]]],
+              retry_on: Tuple[Type[BaseException], ...] = ()) -> None:
+        """
+        Start `workers` tasks on the running event loop
+
+        `handlers` maps a job kind to a coroutine function taking (payload, spooled file path)
+        and returning the job's JSON-serializable result.
+        """
+        self._wakeup = asyncio.Event()
+        self._workers = [asyncio.create_task(self._run(handlers, retry_on)) for _ in range(max(1, workers))]
+
+    async def stop(self) -> None:
+        """Cancel the workers; jobs they were running are queued again on the next start"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def close(self) -> None:
+        self._db_thread.submit(self._db.close).result()
+        self._db_thread.shutdown()
@@ -0,0 +1,108 @@
+import glob
+import os
+from typing import Any, Dict, Optional
+
+from sentence_transformers import SentenceTransformer
+
+from app.config.settings import (
+    ENCODER_INTER_OP_THREADS,
+    ENCODER_INTRA_OP_THREADS,
+    MODEL_BACKENDS,
+    MODEL_CACHE_DIR,
+    ONNX_QUANTIZATION,
+)
+
+
+def _find_onnx_file(model_dir: str, file_name: str) -> Optional[str]:
+    """Path of an ONNX file inside a saved model, relative to the model directory"""
+    matches = glob.glob(os.path.join(model_dir, "**", file_name), recursive=True)
+    return os.path.relpath(matches[0], model_dir) if matches else None
+
+
+def _set_torch_threads(intra_op_threads: int, inter_op_threads: int) -> None:
+    if intra_op_threads <= 0 and inter_op_threads <= 0:
+        return
+    import torch
+
+    if intra_op_threads > 0:
+        torch.set_num_threads(intra_op_threads)
+    if inter_op_threads > 0:
+        try:
+            torch.set_num_interop_threads(inter_op_threads)
+        except RuntimeError as e:
+            # Only allowed before the first inter-op parallel work in the process
+            print(f"Could not set inter-op threads: {str(e)}")
+
+
+def _onnx_model_kwargs(file_name: str, intra_op_threads: int, inter_op_threads: int) -> Dict[str, Any]:
+    import onnxruntime
+
+    session_options = onnxruntime.SessionOptions()
+    if intra_op_threads > 0:
+        session_options.intra_op_num_threads = intra_op_threads
+    if inter_op_threads > 0:
+        session_options.inter_op_num_threads = inter_op_threads
+    return {
+        "file_name": file_name,
+        "provider": "CPUExecutionProvider",
+        "session_options": session_options
+    }
+
+
+def export_onnx_model(model_name: str, backend: str, cache_dir: str = MODEL_CACHE_DIR,
+                      quantization: str = ONNX_QUANTIZATION) -> str:
+    """
+    Export a model to ONNX (optionally int8-quantized) under cache_dir, once
+
+    Returns the path of the ONNX file relative to the exported model directory.
+    A file lock keeps concurrent processes from exporting the same model twice.
+    """
+    from filelock import FileLock
+
+    model_dir = os.path.join(cache_dir, model_name.replace("/", "--"))
+    os.makedirs(cache_dir, exist_ok=True)
+    suffix = f"qint8_{quantization}"
+    file_name = "model.onnx" if backend == "onnx" else f"model_{suffix}.onnx"
+
+    with FileLock(model_dir + ".lock"):
+        if not _find_onnx_file(model_dir, "model.onnx"):
+            print(f"Exporting {model_name} to ONNX in {model_dir}")
+            SentenceTransformer(model_name, backend="onnx", device="cpu").save_pretrained(model_dir)
+        if backend == "onnx-int8" and not _find_onnx_file(model_dir, file_name):
+            from sentence_transformers import export_dynamic_quantized_onnx_model
+
+            print(f"Quantizing {model_name} to int8 ({quantization})")
+            model = SentenceTransformer(
+                model_dir, backend="onnx", device="cpu",
+                model_kwargs={"file_name": _find_onnx_file(model_dir, "model.onnx")}
+            )
+            export_dynamic_quantized_onnx_model(model, quantization, model_dir, file_suffix=suffix)
+
+    found = _find_onnx_file(model_dir, file_name)
+    if not found:
+        raise ValueError(f"ONNX export of {model_name} did not produce {file_name}")
+    return found
+
+
+def load_model(model_name: str, backend: str = "torch", cache_dir: str = MODEL_CACHE_DIR,
+               intra_op_threads: int = ENCODER_INTRA_OP_THREADS,
+               inter_op_threads: int = ENCODER_INTER_OP_THREADS) -> SentenceTransformer:
+    """
+    Load a SentenceTransformer on the CPU with the given inference backend
+
+    "torch" runs PyTorch eager mode; "onnx" and "onnx-int8" run ONNX Runtime on an
+    export cached under cache_dir (built on first use).
+    """
+    if backend not in MODEL_BACKENDS:
+        raise ValueError(f"Unknown model backend '{backend}', expected one of {', '.join(MODEL_BACKENDS)}")
+
+    if backend == "torch":
+        _set_torch_threads(intra_op_threads, inter_op_threads)
+        return SentenceTransformer(model_name)
+
+    file_name = export_onnx_model(model_name, backend, cache_dir)
+    model_dir = os.path.join(cache_dir, model_name.replace("/", "--"))
+    return SentenceTransformer(
+        model_dir, backend="onnx", device="cpu",
+        model_kwargs=_onnx_model_kwargs(file_name, intra_op_threads, inter_op_threads)
+    )
@@ -1,97 +1,534 @@
-from qdrant_client import QdrantClient
+import grpc
+import httpx
+from qdrant_client import AsyncQdrantClient, QdrantClient
 from qdrant_client.http import models
-from app.config.settings import QDRANT_URL, QDRANT_PORT, QDRANT_COLLECTION_NAME, VECTOR_SIZE, RECREATE_COLLECTION
+from qdrant_client.http.exceptions import ResponseHandlingException, UnexpectedResponse
+from app.config.settings import (
+    QDRANT_URL,
+    QDRANT_PORT,
+    QDRANT_PREFER_GRPC,
+    QDRANT_GRPC_PORT,
+    QDRANT_TIMEOUT,
+    QDRANT_POOL_SIZE,
+    QDRANT_COLLECTION_NAME,
+    RECREATE_COLLECTION,
+    UPSERT_BATCH_SIZE,
+    UPSERT_PARALLELISM,
+    UPSERT_MAX_RETRIES,
+    UPSERT_RETRY_BACKOFF_SECONDS,
+    DOC_ID_CACHE_MAX_ENTRIES,
+    STORAGE_PROFILES,
+    STORAGE_PROFILE,
+)
+from app.models.schemas import SearchFilters
+from app.utils.cache import LRUCache
+from app.utils.metrics import qdrant_timer
+import time
 import uuid
-from typing import List, Optional, Dict, Any
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Never stored; deleting it is a no-op write used as an ordering barrier
+BARRIER_POINT_ID = "00000000-0000-0000-0000-000000000000"
+
+# Payload fields used in filters; without an index every filter is a full scan
+PAYLOAD_INDEXES = {
+    "url": models.PayloadSchemaType.KEYWORD,
+    "doc_id": models.PayloadSchemaType.KEYWORD,
+    "call_name": models.PayloadSchemaType.KEYWORD,
+    "file_type": models.PayloadSchemaType.KEYWORD,
+    "date": models.PayloadSchemaType.DATETIME,
+}
+
+def client_options(prefer_grpc: bool = QDRANT_PREFER_GRPC) -> Dict[str, Any]:
+    """Connection settings shared by the sync and async clients"""
+    return {
+        "port": QDRANT_PORT,
+        "grpc_port": QDRANT_GRPC_PORT,
+        "prefer_grpc": prefer_grpc,
+        "timeout": QDRANT_TIMEOUT,
+        # Keep connections alive and reuse them (REST only; gRPC multiplexes one channel)
+        "limits": httpx.Limits(max_connections=QDRANT_POOL_SIZE, max_keepalive_connections=QDRANT_POOL_SIZE)
+    }
+
+def storage_profile(name: Optional[str] = None) -> Dict[str, Any]:
+    name = name or STORAGE_PROFILE
+    if name not in STORAGE_PROFILES:
+        raise ValueError(f"Unknown storage profile {name}. Available profiles: {', '.join(STORAGE_PROFILES)}")
+    return STORAGE_PROFILES[name]
+
+def quantization_config(profile: Dict[str, Any]) -> Optional[models.QuantizationConfig]:
+    if profile["quantization"] == "scalar":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+    if profile["quantization"] == "binary":
+        return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=True))
+    return None
+
+def search_params(profile: Dict[str, Any]) -> Optional[models.SearchParams]:
+    """Search-time HNSW ef and quantization rescoring for a storage profile"""
+    quantization = None
+    if profile["quantization"]:
+        quantization = models.QuantizationSearchParams(
+            rescore=profile["rescore"],
+            oversampling=profile["oversampling"]
+        )
+    if profile["search_ef"] is None and quantization is None:
+        return None
+    return models.SearchParams(hnsw_ef=profile["search_ef"], quantization=quantization)
+
+def _field_filter(key: str, value: Any) -> models.Filter:
+    return models.Filter(
+        must=[
+            models.FieldCondition(
+                key=key,
+                match=models.MatchValue(value=value)
+            )
+        ]
+    )
+
+def search_filter(filters: Optional[SearchFilters]) -> Optional[models.Filter]:
+    """Translate retrieval filters into a Qdrant filter so pruning happens inside the index"""
+    if filters is None:
+        return None
+
+    conditions = []
+    for key, values in (
+        ("call_name", filters.call_names),
+        ("doc_id", filters.doc_ids),
+        ("file_type", filters.file_types),
+    ):
+        if values:
+            conditions.append(models.FieldCondition(key=key, match=models.MatchAny(any=values)))
+    if filters.date_from or filters.date_to:
+        conditions.append(models.FieldCondition(
+            key="date",
+            range=models.DatetimeRange(gte=filters.date_from, lte=filters.date_to)
+        ))
+    for key, value in (filters.tags or {}).items():
+        conditions.append(models.FieldCondition(key=key, match=models.MatchValue(value=value)))
+
+    return models.Filter(must=conditions) if conditions else None
+
+# gRPC status codes of errors that may succeed on retry
+RETRYABLE_GRPC_CODES = {grpc.StatusCode.UNAVAILABLE, grpc.StatusCode.DEADLINE_EXCEEDED, grpc.StatusCode.RESOURCE_EXHAUSTED}
+
+def is_transient_error(error: Exception) -> bool:
+    """
+    Whether a failed Qdrant call may succeed when retried: connection errors, timeouts,
+    429 and 5xx responses. Other errors (bad requests, wrong vector size, ...) are permanent.
+    """
+    if isinstance(error, ResponseHandlingException):
+        error = error.source
+    if isinstance(error, httpx.TransportError):
+        return True
+    if isinstance(error, UnexpectedResponse):
+        return error.status_code is not None and (error.status_code == 429 or error.status_code >= 500)
+    if isinstance(error, grpc.RpcError):
+        return error.code() in RETRYABLE_GRPC_CODES
+    return False
+
+class VectorSizeMismatchError(ValueError):
+    """Raised when an existing collection stores vectors of a different size than the model produces"""
+
 
 class QdrantService:
-    def __init__(self):
-        self.client = QdrantClient(QDRANT_URL, port=QDRANT_PORT)
-        self.collection_name = QDRANT_COLLECTION_NAME
-        self._ensure_collection_exists()
+    def __init__(self, vector_size: int, collection_name: Optional[str] = None, ensure_collection: bool = True,
+                 profile: Optional[str] = None, client: Optional[QdrantClient] = None):
+        # A prebuilt client can be passed in, e.g. QdrantClient(":memory:") for offline benchmarks
+        self.client = client or QdrantClient(QDRANT_URL, **client_options())
+        self.collection_name = collection_name or QDRANT_COLLECTION_NAME
+        self.vector_size = vector_size
+        self.profile = storage_profile(profile)
+        self.search_params = search_params(self.profile)
+        # Bumped after every write so cached search results can be invalidated
+        self.generation = 0
+        self._generation_lock = threading.Lock()
+        self._write_pool = ThreadPoolExecutor(max_workers=UPSERT_PARALLELISM, thread_name_prefix="qdrant-write")
+        # url -> doc_id of documents known to exist; only positive results are cached
+        self.doc_id_cache = LRUCache(DOC_ID_CACHE_MAX_ENTRIES)
+        if ensure_collection:
+            self._ensure_collection_exists()
 
     def _ensure_collection_exists(self):
         try:
             # Check if collection already exists
             collections = self.client.get_collections().collections
             collection_names = [collection.name for collection in collections]
+            # A migrated collection is served through an alias with the old name
+            alias_names = [alias.alias_name for alias in self.client.get_aliases().aliases]
             
             # If the collection exists and we want to recreate it with new dimensions
             if self.collection_name in collection_names and RECREATE_COLLECTION:
-                print(f"Recreating collection {self.collection_name} with {VECTOR_SIZE} dimensions")
+                print(f"Recreating collection {self.collection_name} with {self.vector_size} dimensions")
                 self.client.delete_collection(collection_name=self.collection_name)
                 self._create_collection()
             # If the collection doesn't exist, create it
-            elif self.collection_name not in collection_names:
+            elif self.collection_name not in collection_names + alias_names:
                 self._create_collection()
             else:
                 print(f"Collection {self.collection_name} already exists")
+                self._check_vector_size()
+                self.ensure_payload_indexes()
+        except VectorSizeMismatchError:
+            # Every write would fail, so refuse to start
+            raise
         except Exception as e:
             print(f"Error managing collection: {e}")
+
+    def ensure_payload_indexes(self):
+        """Create missing payload indexes and verify that all of them exist"""
+        try:
+            payload_schema = self.client.get_collection(self.collection_name).payload_schema
+            for field_name, field_schema in PAYLOAD_INDEXES.items():
+                index = payload_schema.get(field_name)
+                if index is not None and index.data_type == field_schema:
+                    continue
+                print(f"Creating {field_schema.value} payload index on {field_name}")
+                self.client.create_payload_index(
+                    collection_name=self.collection_name,
+                    field_name=field_name,
+                    field_schema=field_schema,
+                    wait=True
+                )
+
+            payload_schema = self.client.get_collection(self.collection_name).payload_schema
+            missing = [field_name for field_name in PAYLOAD_INDEXES if field_name not in payload_schema]
+            if missing:
+                print(f"Warning: payload indexes missing on {self.collection_name}: {', '.join(missing)}")
+        except Exception as e:
+            print(f"Error creating payload indexes: {e}")
     
+    def _check_vector_size(self):
+        """Fail when an existing collection does not match the model's embedding size"""
+        vectors_config = self.client.get_collection(self.collection_name).config.params.vectors
+        if vectors_config.size != self.vector_size:
+            raise VectorSizeMismatchError(
+                f"Collection {self.collection_name} stores {vectors_config.size}-d vectors "
+                f"but the model produces {self.vector_size}-d embeddings. "
+                f"Run `python manage_collection.py migrate-dimensions` to convert it."
+            )
+
     def _create_collection(self):
-        """Create a new collection with the configured vector size"""
+        """Create a new collection with the configured vector size and storage profile"""
         try:
-            print(f"Creating collection {self.collection_name} with vector size {VECTOR_SIZE}")
+            print(f"Creating collection {self.collection_name} with vector size {self.vector_size}")
             self.client.create_collection(
                 collection_name=self.collection_name,
                 vectors_config=models.VectorParams(
-                    size=VECTOR_SIZE,
-                    distance=models.Distance.COSINE
-                )
+                    size=self.vector_size,
+                    distance=models.Distance.COSINE,
+                    on_disk=self.profile["on_disk"]
+                ),
+                hnsw_config=models.HnswConfigDiff(
+                    m=self.profile["hnsw_m"],
+                    ef_construct=self.profile["hnsw_ef_construct"]
+                ),
+                quantization_config=quantization_config(self.profile)
             )
             print(f"Collection {self.collection_name} created successfully")
         except Exception as e:
             print(f"Error creating collection: {e}")
+            return
+        self.ensure_payload_indexes()
+
+    def apply_storage_profile(self):
+        """
+        Switch an existing collection to the storage profile in place
+
+        Qdrant rebuilds the HNSW graph and quantized vectors in the background; the
+        collection keeps serving searches while the optimizers run.
+        """
+        self.client.update_collection(
+            collection_name=self.collection_name,
+            vectors_config={"": models.VectorParamsDiff(on_disk=self.profile["on_disk"])},
+            hnsw_config=models.HnswConfigDiff(
+                m=self.profile["hnsw_m"],
+                ef_construct=self.profile["hnsw_ef_construct"]
+            ),
+            quantization_config=quantization_config(self.profile) or models.Disabled.DISABLED
+        )
 
     def get_existing_doc_id(self, url: str) -> Optional[str]:
+        cached = self.doc_id_cache.get(str(url))
+        if cached is not None:
+            return cached
         try:
-            search_results = self.client.scroll(
-                collection_name=self.collection_name,
-                scroll_filter=models.Filter(
-                    must=[
-                        models.FieldCondition(
-                            key="url",
-                            match=models.MatchValue(value=str(url))
-                        )
-                    ]
-                ),
-                limit=1
-            )
+            with qdrant_timer("get_existing_doc_id"):
+                search_results = self.client.scroll(
+                    collection_name=self.collection_name,
+                    scroll_filter=_field_filter("url", str(url)),
+                    limit=1,
+                    with_vectors=False
+                )
             if search_results[0]:
-                return search_results[0][0].payload["doc_id"]
+                doc_id = search_results[0][0].payload["doc_id"]
+                self.doc_id_cache.put(str(url), doc_id)
+                return doc_id
             return None
         except Exception as e:
             print(f"Error checking URL existence: {e}")
             return None
 
     def delete_document_chunks(self, doc_id: str):
+        # Deleting whole documents is rare, so drop the url map instead of searching it
+        self.doc_id_cache.clear()
         try:
-            self.client.delete(
-                collection_name=self.collection_name,
-                points_selector=models.FilterSelector(
-                    filter=models.Filter(
-                        must=[
-                            models.FieldCondition(
-                                key="doc_id",
-                                match=models.MatchValue(value=doc_id)
-                            )
-                        ]
+            with qdrant_timer("delete_document"):
+                self.client.delete(
+                    collection_name=self.collection_name,
+                    points_selector=models.FilterSelector(
+                        filter=_field_filter("doc_id", doc_id)
                     )
                 )
-            )
         except Exception as e:
             print(f"Error deleting document chunks: {e}")
+        finally:
+            self._bump_generation()
+
+    def get_document_payloads(self, doc_id: str) -> Dict[str, Dict[str, Any]]:
+        """Return the payload (without the chunk text) of every point stored for a document, by point ID"""
+        payloads = {}
+        offset = None
+        while True:
+            with qdrant_timer("get_document_payloads"):
+                records, offset = self.client.scroll(
+                    collection_name=self.collection_name,
+                    scroll_filter=_field_filter("doc_id", doc_id),
+                    limit=1000,
+                    offset=offset,
+                    with_payload=models.PayloadSelectorExclude(exclude=["text"]),
+                    with_vectors=False
+                )
+            payloads.update((str(record.id), record.payload or {}) for record in records)
+            if offset is None:
+                break
+        return payloads
+
+    def apply_document_update(self, upserts: List[Dict[str, Any]], payload_updates: List[Tuple[Dict[str, Any], List[str]]],
+                              payload_deletes: List[Tuple[List[str], List[str]]], delete_ids: List[str], wait: bool = True):
+        """
+        Upsert new points, then update the payload of kept points and delete removed points
+
+        `payload_updates` holds (fields, point IDs) pairs: each sets those fields on those
+        points and leaves the rest of their payload (e.g. the chunk text) alone.
+        `payload_deletes` holds (keys, point IDs) pairs of fields to remove. Upserts go
+        through the batched bulk path; the rest is sent as batch_update_points requests
+        of at most UPSERT_BATCH_SIZE operations.
+        """
+        self.upsert_points(upserts, wait=wait)
+
+        operations = []
+        for payload, point_ids in payload_updates:
+            operations.append(models.SetPayloadOperation(
+                set_payload=models.SetPayload(payload=payload, points=point_ids)
+            ))
+        for keys, point_ids in payload_deletes:
+            operations.append(models.DeletePayloadOperation(
+                delete_payload=models.DeletePayload(keys=keys, points=point_ids)
+            ))
+        for start in range(0, len(delete_ids), UPSERT_BATCH_SIZE):
+            operations.append(models.DeleteOperation(
+                delete=models.PointIdsList(points=delete_ids[start:start + UPSERT_BATCH_SIZE])
+            ))
+        if not operations:
+            return
 
-    def upsert_points(self, points: List[Dict[str, Any]]):
-        self.client.upsert(
+        try:
+            for start in range(0, len(operations), UPSERT_BATCH_SIZE):
+                self._with_retry(
+                    self.client.batch_update_points,
+                    collection_name=self.collection_name,
+                    update_operations=operations[start:start + UPSERT_BATCH_SIZE],
+                    wait=wait
+                )
+        finally:
+            self._bump_generation()
+
+    def upsert_points(self, points: List[Dict[str, Any]], batch_size: int = UPSERT_BATCH_SIZE,
+                      parallelism: int = UPSERT_PARALLELISM, wait: bool = True):
+        """
+        Bulk upsert: split points into batches, send up to `parallelism` batches at once
+        and retry failed batches with exponential backoff
+
+        With wait=False Qdrant acknowledges batches before applying them; call flush()
+        before relying on the data being searchable.
+        """
+        batches = [
+            [point if isinstance(point, models.PointStruct) else models.PointStruct(**point)
+             for point in points[start:start + batch_size]]
+            for start in range(0, len(points), batch_size)
+        ]
+        if not batches:
+            return
+
+        try:
+            if len(batches) == 1 or parallelism <= 1:
+                for batch in batches:
+                    self._upsert_batch(batch, wait)
+            else:
+                # At most UPSERT_PARALLELISM requests are in flight across all callers
+                futures = [self._write_pool.submit(self._upsert_batch, batch, wait) for batch in batches[:parallelism]]
+                for batch in batches[parallelism:]:
+                    futures.pop(0).result()
+                    futures.append(self._write_pool.submit(self._upsert_batch, batch, wait))
+                for future in futures:
+                    future.result()
+            self._remember_doc_ids(points)
+        finally:
+            self._bump_generation()
+
+    def _remember_doc_ids(self, points: List[Any]):
+        """Record url -> doc_id for the documents being written"""
+        doc_ids = {}
+        for point in points:
+            payload = point.payload if isinstance(point, models.PointStruct) else point.get("payload")
+            if payload and "url" in payload and "doc_id" in payload:
+                doc_ids[str(payload["url"])] = payload["doc_id"]
+        for url, doc_id in doc_ids.items():
+            self.doc_id_cache.put(url, doc_id)
+
+    def _upsert_batch(self, batch: List[models.PointStruct], wait: bool):
+        self._with_retry(
+            self.client.upsert,
             collection_name=self.collection_name,
-            points=points
+            points=batch,
+            wait=wait
         )
 
-    def search_points(self, query_vector: List[float], limit: int):
-        return self.client.query_points(
-            collection_name=self.collection_name,
-            query=query_vector,
-            limit=limit
-        ) 
\ No newline at end of file
+    def _with_retry(self, func: Callable[..., Any], **kwargs: Any) -> Any:
+        """
+        Call a Qdrant write, retrying transient failures with exponential backoff (writes
+        here are idempotent); permanent errors are raised at once
+        """
+        for attempt in range(UPSERT_MAX_RETRIES + 1):
+            try:
+                with qdrant_timer(func.__name__):
+                    return func(**kwargs)
+            except Exception as e:
+                if attempt == UPSERT_MAX_RETRIES or not is_transient_error(e):
+                    raise
+                delay = UPSERT_RETRY_BACKOFF_SECONDS * (2 ** attempt)
+                print(f"Qdrant write failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def flush(self):
+        """
+        Block until all previously acknowledged writes are applied
+
+        Qdrant applies the updates of a collection in order, so waiting for a no-op
+        delete to complete also waits for every write queued before it.
+        """
+        try:
+            with qdrant_timer("flush"):
+                self.client.delete(
+                    collection_name=self.collection_name,
+                    points_selector=models.PointIdsList(points=[BARRIER_POINT_ID]),
+                    wait=True
+                )
+        finally:
+            self._bump_generation()
+
+    def ping(self):
+        self.client.get_collections()
+
+    def close(self):
+        self._write_pool.shutdown(wait=True)
+        self.client.close()
+
+    def _bump_generation(self):
+        with self._generation_lock:
+            self.generation += 1
+
+    def search_points(self, query_vector: List[float], limit: int, filters: Optional[SearchFilters] = None):
+        with qdrant_timer("search"):
+            return self.client.query_points(
+                collection_name=self.collection_name,
+                query=query_vector,
+                query_filter=search_filter(filters),
+                search_params=self.search_params,
+                limit=limit
+            )
+
+    def search_groups(self, query_vector: List[float], limit: int, group_size: int,
+                      filters: Optional[SearchFilters] = None):
+        """Top `limit` documents, each with its best `group_size` chunks, grouped by Qdrant"""
+        with qdrant_timer("search_groups"):
+            return self.client.query_points_groups(
+                collection_name=self.collection_name,
+                query=query_vector,
+                group_by="doc_id",
+                limit=limit,
+                group_size=group_size,
+                query_filter=search_filter(filters),
+                search_params=self.search_params
+            )
+
+
+class AsyncQdrantService:
+    """
+    Read path for the FastAPI endpoints on top of AsyncQdrantClient
+
+    Searches and lookups run on the event loop without occupying a thread of the
+    qdrant stage; writes stay on QdrantService and its batched bulk path.
+    """
+
+    def __init__(self, collection_name: Optional[str] = None, doc_id_cache: Optional[LRUCache] = None,
+                 profile: Optional[str] = None):
+        self.client = AsyncQdrantClient(QDRANT_URL, **client_options())
+        self.collection_name = collection_name or QDRANT_COLLECTION_NAME
+        self.search_params = search_params(storage_profile(profile))
+        # Share QdrantService.doc_id_cache so lookups see the writes made through it
+        self.doc_id_cache = doc_id_cache if doc_id_cache is not None else LRUCache(DOC_ID_CACHE_MAX_ENTRIES)
+
+    async def get_existing_doc_id(self, url: str) -> Optional[str]:
+        cached = self.doc_id_cache.get(str(url))
+        if cached is not None:
+            return cached
+        try:
+            with qdrant_timer("get_existing_doc_id"):
+                records, _ = await self.client.scroll(
+                    collection_name=self.collection_name,
+                    scroll_filter=_field_filter("url", str(url)),
+                    limit=1,
+                    with_vectors=False
+                )
+            if records:
+                doc_id = records[0].payload["doc_id"]
+                self.doc_id_cache.put(str(url), doc_id)
+                return doc_id
+            return None
+        except Exception as e:
+            print(f"Error checking URL existence: {e}")
+            return None
+
+    async def search_points(self, query_vector: List[float], limit: int, filters: Optional[SearchFilters] = None):
+        with qdrant_timer("search"):
+            return await self.client.query_points(
+                collection_name=self.collection_name,
+                query=query_vector,
+                query_filter=search_filter(filters),
+                search_params=self.search_params,
+                limit=limit
+            )
+
+    async def search_groups(self, query_vector: List[float], limit: int, group_size: int,
+                            filters: Optional[SearchFilters] = None):
+        with qdrant_timer("search_groups"):
+            return await self.client.query_points_groups(
+                collection_name=self.collection_name,
+                query=query_vector,
+                group_by="doc_id",
+                limit=limit,
+                group_size=group_size,
+                query_filter=search_filter(filters),
+                search_params=self.search_params
+            )
+
+    async def ping(self):
+        await self.client.get_collections()
+
+    async def close(self):
+        await self.client.close()
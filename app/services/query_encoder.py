@@ -0,0 +1,83 @@
+import asyncio
+from typing import List, Optional, Set, Tuple
+
+from app.services.text_service import TextService
+from app.utils.concurrency import StageExecutor
+
+
+class QueryEncoder:
+    """
+    Micro-batching front end for query embeddings
+
+    Concurrent callers are collected for up to `window_ms` milliseconds (or until
+    `max_batch_size` queries are waiting) and encoded with a single model call,
+    then each caller receives its own embedding. Queries found in TextService's
+    query cache are answered immediately. Batches run one at a time, since they all
+    go to the same model; a batch flushed while another runs waits its turn here
+    instead of blocking a query worker thread.
+    """
+
+    def __init__(self, text_service: TextService, stage: StageExecutor, window_ms: float, max_batch_size: int):
+        self.text_service = text_service
+        self.stage = stage
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max(1, max_batch_size)
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._batches: Set[asyncio.Task] = set()
+        self._serial = asyncio.Lock()
+
+    async def encode(self, query: str) -> List[float]:
+        """Return the embedding for a single query, batched with concurrent callers"""
+        # Repeated queries skip the batch window and inference entirely
+        cached = self.text_service.cached_query_embedding(query)
+        if cached is not None:
+            return cached
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((query, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        # Skip callers that were cancelled (e.g. client disconnected) while waiting
+        batch = [(query, future) for query, future in self._pending if not future.done()]
+        self._pending = []
+        if not batch:
+            return
+
+        task = asyncio.ensure_future(self._run_batch(batch))
+        self._batches.add(task)
+        task.add_done_callback(self._batches.discard)
+
+    async def _run_batch(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        async with self._serial:
+            # Callers may have gone away while the previous batch ran
+            batch = [(query, future) for query, future in batch if not future.done()]
+            if not batch:
+                return
+            # Identical queries in the same window are encoded once
+            unique_queries = list(dict.fromkeys(query for query, _ in batch))
+            try:
+                embeddings = await self.stage.run(self.text_service.embed_queries, unique_queries)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+        by_query = dict(zip(unique_queries, embeddings))
+        for query, future in batch:
+            if not future.done():
+                future.set_result(by_query[query])
+
@@ -1,46 +1,128 @@
-import requests
+import bisect
+import threading
+import time
+import unicodedata
 import numpy as np
 from bs4 import BeautifulSoup
-from sentence_transformers import SentenceTransformer
 from semantic_text_splitter import TextSplitter
-from app.config.settings import MODEL_NAME, VECTOR_SIZE
+from app.config.settings import (
+    CHUNK_MAX_TOKENS,
+    CHUNK_OVERLAP_TOKENS,
+    EMBEDDING_STORE_DIR,
+    EMBEDDING_STORE_MAX_BYTES,
+    ENCODE_MAX_BATCH_SIZE,
+    ENCODE_TOKEN_BUDGET,
+    MODEL_BACKEND,
+    MODEL_NAME,
+    QUERY_CACHE_MAX_ENTRIES,
+    QUERY_CACHE_TTL_SECONDS,
+)
 from fastapi import HTTPException
-from typing import List, Optional
-from app.models.schemas import AuthHeaders, BasicAuth
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from app.services.model_loader import load_model
+from app.utils.cache import LRUCache
+from app.utils.embedding_store import EmbeddingStore
+from app.utils.metrics import ENCODE_BATCH_SIZE, ENCODE_PADDED_TOKENS, ENCODE_SECONDS, ENCODE_TOKENS, ENCODED_TEXTS
+
+# Rough characters per token, used when the model has no tokenizer to count with
+CHARS_PER_TOKEN = 4
+# Text is split in windows of about this many chunks, so long documents are never split whole
+STREAM_WINDOW_CHUNKS = 16
+# Fallback token limit for models that do not report max_seq_length
+DEFAULT_MAX_SEQ_LENGTH = 384
+
+def plan_batches(lengths: List[int], token_budget: int, max_batch_size: int) -> List[List[int]]:
+    """
+    Group text indices into batches of similar length
+
+    Indices are sorted longest first and a batch is closed as soon as one more text would
+    push batch size x longest length past token_budget, so padding stays small and every
+    model call does about the same amount of work. A text longer than the budget gets a
+    batch of its own.
+    """
+    batches: List[List[int]] = []
+    current: List[int] = []
+    longest = 0
+    for i in sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True):
+        longest = longest or lengths[i]
+        if current and ((len(current) + 1) * longest > token_budget or len(current) >= max_batch_size):
+            batches.append(current)
+            current, longest = [], lengths[i]
+        current.append(i)
+    if current:
+        batches.append(current)
+    return batches
 
 class TextService:
-    def __init__(self):
-        self.model = SentenceTransformer(MODEL_NAME)
-        self.splitter = TextSplitter(3000)  # Larger chunk size for better context
-        self.chunk_size = 300  # Increased number of words per chunk for better context
+    def __init__(self, model=None, backend: str = MODEL_BACKEND, token_budget: int = ENCODE_TOKEN_BUDGET,
+                 embedding_store: Optional[EmbeddingStore] = None):
+        # Any object with encode() and get_sentence_embedding_dimension() can stand in for the model
+        self.backend = backend
+        self.model = model or load_model(MODEL_NAME, backend)
+        # The model's tokenizer is reconfigured on every encode call and fails ("Already
+        # borrowed") when two threads use it at once, so in-process encode calls take turns
+        self._model_lock = threading.Lock()
+        # Vectors are stored at the model's native size
+        self.vector_size = self.model.get_sentence_embedding_dimension()
+        self.max_seq_length = getattr(self.model, "max_seq_length", None) or DEFAULT_MAX_SEQ_LENGTH
+        self.tokenizer = self._counting_tokenizer()
+        self.chunk_tokens, self.chunk_overlap = self._chunk_limits(CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS)
+        self.splitter = self._make_splitter()
+        self.stream_window = self.chunk_tokens * CHARS_PER_TOKEN * STREAM_WINDOW_CHUNKS
+        self.token_budget = token_budget
+        # Optional EncoderPool; when set, document batches are encoded by its worker processes
+        self.encoder_pool = None
+        # Stand-in models never share the configured model's on-disk store
+        if embedding_store is None and model is None and EMBEDDING_STORE_DIR:
+            embedding_store = EmbeddingStore(
+                EMBEDDING_STORE_DIR, MODEL_NAME, backend, self.vector_size, EMBEDDING_STORE_MAX_BYTES
+            )
+        self.embedding_store = embedding_store
+        self.query_cache = LRUCache(QUERY_CACHE_MAX_ENTRIES, QUERY_CACHE_TTL_SECONDS)
 
-    def extract_text_from_url(self, url: str, auth_headers: Optional[AuthHeaders] = None, basic_auth: Optional[BasicAuth] = None) -> str:
+    def _counting_tokenizer(self):
         """
-        Extract text content from a URL with optional authentication
+        Private copy of the model's fast tokenizer, without padding or truncation, for counting tokens
+
+        The model's own tokenizer is reconfigured on every encode call, so it is not shared.
+        This copy is never reconfigured after setup, so any number of threads can use it.
+        None when the model has no Hugging Face tokenizer.
         """
-        try:
-            # Prepare request parameters
-            request_kwargs = {
-                'url': url,
-                'headers': {},
-                'auth': None,
-                'timeout': 30
-            }
-
-            # Add custom headers if provided
-            if auth_headers:
-                request_kwargs['headers'].update(auth_headers.headers)
-
-            # Add basic auth if provided
-            if basic_auth:
-                request_kwargs['auth'] = (basic_auth.username, basic_auth.password)
-
-            # Make the request
-            response = requests.get(**request_kwargs)
-            response.raise_for_status()
+        backend_tokenizer = getattr(getattr(self.model, "tokenizer", None), "backend_tokenizer", None)
+        if backend_tokenizer is None:
+            return None
+        from tokenizers import Tokenizer
+
+        tokenizer = Tokenizer.from_str(backend_tokenizer.to_str())
+        tokenizer.no_padding()
+        tokenizer.no_truncation()
+        return tokenizer
+
+    def _chunk_limits(self, max_tokens: int, overlap_tokens: int) -> Tuple[int, int]:
+        """Chunk capacity and overlap in tokens, capped at what the model actually encodes"""
+        special_tokens = self.tokenizer.post_processor.num_special_tokens_to_add(False) if self.tokenizer and self.tokenizer.post_processor else 2
+        model_limit = self.max_seq_length - special_tokens
+        capacity = min(max_tokens, model_limit) if max_tokens > 0 else model_limit
+        return capacity, min(max(overlap_tokens, 0), capacity // 2)
 
+    def _make_splitter(self) -> TextSplitter:
+        """
+        Semantic splitter that counts chunk sizes with the model's tokenizer
+
+        Models without a Hugging Face tokenizer (e.g. benchmark stubs) get a character
+        splitter sized at CHARS_PER_TOKEN characters per token.
+        """
+        if self.tokenizer is not None:
+            return TextSplitter.from_huggingface_tokenizer(self.tokenizer, self.chunk_tokens, overlap=self.chunk_overlap)
+        return TextSplitter(self.chunk_tokens * CHARS_PER_TOKEN, overlap=self.chunk_overlap * CHARS_PER_TOKEN)
+
+    def extract_text_from_html(self, html: str) -> str:
+        """
+        Extract readable text content from an HTML page
+        """
+        try:
             # Parse HTML content
-            soup = BeautifulSoup(response.text, 'html.parser')
+            soup = BeautifulSoup(html, 'html.parser')
 
             # Remove script and style elements
             for script in soup(["script", "style"]):
@@ -56,76 +138,175 @@ class TextService:
 
             return text
 
-        except requests.RequestException as e:
-            raise ValueError(f"Error fetching URL: {str(e)}")
         except Exception as e:
             raise ValueError(f"Error processing text: {str(e)}")
 
     def chunk_text(self, text: str) -> List[str]:
         """
-        Split text into chunks of approximately chunk_size words
+        Split text into chunks of at most chunk_tokens tokens
+        """
+        pieces = ((None, text[start:start + self.stream_window], False) for start in range(0, len(text), self.stream_window))
+        return [chunk for chunk, _, _ in self._split_stream(pieces)]
+
+    def chunk_segments(self, segments: Iterable[Tuple[Optional[int], str]]) -> Iterator[Tuple[str, Optional[int], Optional[int]]]:
+        """
+        Incrementally split (page number, text) segments into chunks of at most chunk_tokens tokens
+
+        Yields (chunk, first page, last page) as soon as each chunk is complete, so pages
+        can be consumed while they are still being extracted; chunks span page breaks.
+        """
+        return self._split_stream((page, text, True) for page, text in segments if text.strip())
+
+    def _split_stream(self, pieces: Iterable[Tuple[Optional[int], str, bool]]) -> Iterator[Tuple[str, Optional[int], Optional[int]]]:
+        """
+        Split a stream of (page, text, starts new segment) pieces with the semantic splitter
+
+        Text is buffered until about stream_window characters are waiting. The buffer is then
+        split and every chunk but the last is emitted; the last one may be cut short by the end
+        of the buffer, so its text is carried over and split again with the text that follows.
+        New segments are joined with a blank line so page breaks are preferred split points.
+        """
+        buffer = ""
+        offsets: List[int] = []  # buffer offset where each page starts
+        pages: List[Optional[int]] = []
+
+        def page_at(offset: int) -> Optional[int]:
+            return pages[max(bisect.bisect_right(offsets, offset) - 1, 0)]
+
+        for page, text, new_segment in pieces:
+            if buffer and new_segment:
+                buffer += "\n\n"
+            if not pages or pages[-1] != page or new_segment:
+                offsets.append(len(buffer))
+                pages.append(page)
+            buffer += text
+            if len(buffer) < self.stream_window:
+                continue
+
+            chunks = self.splitter.chunk_indices(buffer)
+            if len(chunks) < 2:
+                continue
+            for offset, chunk in chunks[:-1]:
+                yield chunk, page_at(offset), page_at(offset + len(chunk) - 1)
+
+            carry = chunks[-1][0]
+            first = max(bisect.bisect_right(offsets, carry) - 1, 0)
+            offsets = [0] + [offset - carry for offset in offsets[first + 1:]]
+            pages = pages[first:]
+            buffer = buffer[carry:]
+
+        for offset, chunk in self.splitter.chunk_indices(buffer):
+            yield chunk, page_at(offset), page_at(offset + len(chunk) - 1)
+
+    def chunk_document(self, segments: Iterable[Tuple[Optional[int], str]]) -> Tuple[List[str], Optional[List[Dict[str, Any]]]]:
+        """
+        Chunk a document's segments and return (chunks, per-chunk payloads)
+
+        Per-chunk payloads hold the page_start/page_end of each chunk, or are None
+        when the document has no pages.
         """
-        words = text.split()
         chunks = []
-        
-        for i in range(0, len(words), self.chunk_size):
-            chunk = ' '.join(words[i:i + self.chunk_size])
-            if chunk:  # Only add non-empty chunks
-                chunks.append(chunk)
-        
-        return chunks
-
-    def expand_embedding_dimensions(self, embedding: List[float], target_size: int) -> List[float]:
-        """
-        Expand embedding to the target size
-        
-        Strategy:
-        1. Repeat the embedding until we're close to the target size
-        2. If needed, pad with zeros at the end to exactly match the target size
-        """
-        original_size = len(embedding)
-        
-        # Calculate how many times to repeat the original embedding
-        repeat_times = target_size // original_size
-        
-        # Repeat the embedding
-        expanded = embedding * repeat_times
-        
-        # Calculate how many elements are still needed
-        remaining = target_size - len(expanded)
-        
-        # Add any remaining elements by padding with zeros
-        if remaining > 0:
-            expanded.extend([0.0] * remaining)
-            
-        return expanded
-
-    def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """
-        Generate embeddings for a list of text chunks and expand to VECTOR_SIZE
+        pages = []
+        for chunk, first_page, last_page in self.chunk_segments(segments):
+            chunks.append(chunk)
+            pages.append((first_page, last_page))
+
+        if not any(first_page is not None for first_page, _ in pages):
+            return chunks, None
+        return chunks, [{"page_start": first_page, "page_end": last_page} for first_page, last_page in pages]
+
+    def token_lengths(self, texts: List[str]) -> List[int]:
+        """Tokens the encoder will see for each text, special tokens included and truncation applied"""
+        if self.tokenizer is not None:
+            lengths = [len(encoding.ids) for encoding in self.tokenizer.encode_batch(texts)]
+        else:
+            lengths = [len(text) // CHARS_PER_TOKEN + 2 for text in texts]
+        return [max(1, min(length, self.max_seq_length)) for length in lengths]
+
+    def plan_encode_batches(self, texts: List[str], token_budget: Optional[int] = None) -> Tuple[List[List[int]], List[int]]:
+        """Length-bucketed batches of text indices, and the token length of each text"""
+        lengths = self.token_lengths(texts)
+        return plan_batches(lengths, token_budget or self.token_budget, ENCODE_MAX_BATCH_SIZE), lengths
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        with self._model_lock:
+            return self.model.encode(texts, batch_size=len(texts))
+
+    def encode_bulk(self, texts: List[str], kind: str = "document", token_budget: Optional[int] = None) -> List[List[float]]:
+        """
+        Encode any number of texts in length-bucketed, token-budgeted model calls
+
+        Embeddings are returned in the order of `texts`. Document batches go to the encoder
+        pool when one is attached; queries stay in-process, where they don't pay for IPC.
+        Model calls, tokens (with and without padding) and encode time are recorded under
+        `kind` in the metrics.
+        """
+        if not texts:
+            return []
+        batches, lengths = self.plan_encode_batches(texts, token_budget)
+        embeddings: List[Optional[List[float]]] = [None] * len(texts)
+        started = time.perf_counter()
+        batch_texts = [[texts[i] for i in batch] for batch in batches]
+        if self.encoder_pool is not None and kind == "document":
+            results = self.encoder_pool.encode_batches(batch_texts)
+        else:
+            results = (self._encode(batch) for batch in batch_texts)
+        for batch, vectors in zip(batches, results):
+            for i, vector in zip(batch, vectors.tolist()):
+                embeddings[i] = vector
+            ENCODE_BATCH_SIZE.labels(kind).observe(len(batch))
+            ENCODE_PADDED_TOKENS.labels(kind).inc(len(batch) * lengths[batch[0]])
+        ENCODE_SECONDS.labels(kind).inc(time.perf_counter() - started)
+        ENCODED_TEXTS.labels(kind).inc(len(texts))
+        ENCODE_TOKENS.labels(kind).inc(sum(lengths))
+        return embeddings
+
+    def generate_embeddings(self, texts: List[str], kind: str = "document") -> List[List[float]]:
+        """
+        Generate embeddings for a list of text chunks
+
+        With an embedding store, document chunks already in the store are read from disk
+        and only the rest are encoded (and then stored).
         """
         try:
-            # Generate embeddings with the model's native size
-            model_embeddings = self.model.encode(texts)
-            
-            # Convert to list for processing
-            embeddings_list = model_embeddings.tolist()
-            
-            # Get the actual output dimension
-            actual_size = len(embeddings_list[0]) if embeddings_list else 0
-            
-            # If the model's output doesn't match our target size, expand the dimensions
-            if actual_size != VECTOR_SIZE:
-                print(f"Expanding embeddings from {actual_size} to {VECTOR_SIZE} dimensions")
-                expanded_embeddings = []
-                
-                for embedding in embeddings_list:
-                    expanded = self.expand_embedding_dimensions(embedding, VECTOR_SIZE)
-                    expanded_embeddings.append(expanded)
-                
-                return expanded_embeddings
-            else:
-                return embeddings_list
-                
+            if self.embedding_store is None or kind != "document":
+                return self.encode_bulk(texts, kind)
+
+            # The store is only a cache: if it fails, everything is encoded
+            try:
+                stored = self.embedding_store.get_many(texts)
+            except Exception as e:
+                print(f"Error reading embedding store: {str(e)}")
+                stored = {}
+            missing = list(dict.fromkeys(text for text in texts if text not in stored))
+            if missing:
+                encoded = dict(zip(missing, self.encode_bulk(missing, kind)))
+                try:
+                    self.embedding_store.put_many(encoded)
+                except Exception as e:
+                    print(f"Error writing embedding store: {str(e)}")
+                stored.update(encoded)
+            return [stored[text] for text in texts]
         except Exception as e:
-            raise ValueError(f"Error generating embeddings: {str(e)}") 
\ No newline at end of file
+            raise ValueError(f"Error generating embeddings: {str(e)}")
+
+    def query_cache_key(self, query: str) -> Tuple[str, str, str]:
+        """
+        Cache key for a query: model name and backend plus the query with unicode and whitespace
+        normalized (the tokenizer ignores whitespace differences, so the embedding is identical)
+        """
+        normalized = " ".join(unicodedata.normalize("NFC", query).split())
+        return (MODEL_NAME, self.backend, normalized)
+
+    def cached_query_embedding(self, query: str) -> Optional[List[float]]:
+        """Return the cached embedding for a query, or None on a miss"""
+        return self.query_cache.get(self.query_cache_key(query))
+
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """
+        Generate embeddings for queries and store them in the query cache
+        """
+        embeddings = self.generate_embeddings(queries, kind="query")
+        for query, embedding in zip(queries, embeddings):
+            self.query_cache.put(self.query_cache_key(query), embedding)
+        return embeddings
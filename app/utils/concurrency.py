@@ -0,0 +1,105 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable
+
+from fastapi import Request
+
+from app.utils.metrics import EXECUTOR_PENDING, EXECUTOR_REJECTED, EXECUTOR_RUN_SECONDS, EXECUTOR_WAIT_SECONDS
+
+
+class StageSaturatedError(Exception):
+    """Raised when a stage already holds its maximum number of pending tasks"""
+
+    def __init__(self, stage: str):
+        super().__init__(f"The '{stage}' stage is saturated, retry later")
+        self.stage = stage
+
+
+class ClientDisconnectedError(Exception):
+    """Raised when the client went away before the request finished"""
+
+
+class StageExecutor:
+    """
+    Bounded thread pool for one stage of request processing (fetch, inference, ...)
+
+    At most `max_workers` tasks of the stage run at once and at most `max_pending`
+    tasks may be running or queued; further submissions raise StageSaturatedError
+    instead of growing the queue without limit.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_pending: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_pending = max(max_pending, max_workers)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-stage")
+        self._pending = 0
+        self._lock = threading.Lock()
+        EXECUTOR_PENDING.labels(name).set_function(lambda: self._pending)
+        self._wait_seconds = EXECUTOR_WAIT_SECONDS.labels(name)
+        self._run_seconds = EXECUTOR_RUN_SECONDS.labels(name)
+
+    @property
+    def pending(self) -> int:
+        """Number of tasks currently running or waiting in this stage"""
+        return self._pending
+
+    def _release(self, _future) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    async def run(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run a blocking callable in the stage pool and await its result"""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                EXECUTOR_REJECTED.labels(self.name).inc()
+                raise StageSaturatedError(self.name)
+            self._pending += 1
+
+        try:
+            future = self._executor.submit(self._timed, time.perf_counter(), func, *args, **kwargs)
+        except BaseException:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # Drop the task if a worker has not picked it up yet
+            future.cancel()
+            raise
+
+    def _timed(self, submitted: float, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        started = time.perf_counter()
+        self._wait_seconds.observe(started - submitted)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self._run_seconds.observe(time.perf_counter() - started)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def cancel_on_disconnect(request: Request, awaitable: Awaitable[Any], poll_interval: float = 0.1) -> Any:
+    """
+    Await `awaitable`, cancelling it if the client disconnects in the meantime
+
+    Work already running inside a stage thread finishes, but queued stage tasks
+    and all following stages are abandoned.
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                raise ClientDisconnectedError()
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
@@ -0,0 +1,185 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Mapping, Sequence
+
+import numpy as np
+import portalocker
+
+# Max keys per SQL "IN (...)" lookup, below SQLite's bound-parameter limit
+LOOKUP_BATCH = 500
+
+
+class EmbeddingStore:
+    """
+    Persistent on-disk embedding cache for one model, keyed by a hash of the chunk text
+
+    Vectors live in a fixed-size memory-mapped float32 file (one slot per vector), and
+    an SQLite index in WAL mode maps each text hash to its slot, a CRC32 of the vector
+    and its last use. Any number of threads and processes can read concurrently.
+    Writers serialize on a file lock and write the vector before the index row points
+    to it. A reader that races with the reuse of a slot sees a checksum mismatch and
+    treats the entry as a miss. When all slots are used, the least recently used
+    entries are evicted.
+    """
+
+    def __init__(self, root: str, model_name: str, backend: str, dimension: int, max_bytes: int):
+        self.dimension = dimension
+        self.path = os.path.join(root, f"{model_name.replace('/', '--')}--{backend}--{dimension}")
+        os.makedirs(self.path, exist_ok=True)
+        self._vectors_path = os.path.join(self.path, "vectors.f32")
+        self._index_path = os.path.join(self.path, "index.sqlite")
+        self._lock_path = os.path.join(self.path, "write.lock")
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.corrupt = 0
+
+        with self._write_lock():
+            db = self._db()
+            with db:
+                db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)")
+                db.execute(
+                    "CREATE TABLE IF NOT EXISTS entries ("
+                    "key TEXT PRIMARY KEY, slot INTEGER NOT NULL, checksum INTEGER NOT NULL, last_used REAL NOT NULL)"
+                )
+                db.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+                # The capacity is fixed when the store is created; delete the directory to resize it
+                db.execute(
+                    "INSERT OR IGNORE INTO meta VALUES ('capacity', ?)",
+                    (max(1, max_bytes // (dimension * 4)),)
+                )
+                db.execute("INSERT OR IGNORE INTO meta VALUES ('next_slot', 0)")
+                db.execute("INSERT OR IGNORE INTO meta VALUES ('entries', 0)")
+            self.capacity = self._meta(db, "capacity")
+            size = self.capacity * dimension * 4
+            if not os.path.exists(self._vectors_path) or os.path.getsize(self._vectors_path) < size:
+                # Sparse on most filesystems: disk is only used as slots are written
+                with open(self._vectors_path, "ab") as f:
+                    f.truncate(size)
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(self.capacity, dimension))
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _checksum(vector: np.ndarray) -> int:
+        return zlib.crc32(np.ascontiguousarray(vector, dtype=np.float32).tobytes())
+
+    def _db(self) -> sqlite3.Connection:
+        """One connection per thread"""
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self._index_path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    @staticmethod
+    def _meta(db: sqlite3.Connection, name: str) -> int:
+        return db.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()[0]
+
+    def _write_lock(self):
+        """Exclusive lock shared by all writer threads and processes"""
+        return portalocker.Lock(self._lock_path, mode="a", timeout=60)
+
+    def get_many(self, texts: Sequence[str]) -> Dict[str, List[float]]:
+        """Stored embeddings of the given texts, by text; texts not in the store are left out"""
+        keys = {self.key(text): text for text in texts}
+        db = self._db()
+        found: Dict[str, List[float]] = {}
+        used = []
+        key_list = list(keys)
+        for start in range(0, len(key_list), LOOKUP_BATCH):
+            batch = key_list[start:start + LOOKUP_BATCH]
+            rows = db.execute(
+                f"SELECT key, slot, checksum FROM entries WHERE key IN ({','.join('?' * len(batch))})", batch
+            ).fetchall()
+            for key, slot, checksum in rows:
+                vector = np.array(self._vectors[slot])
+                if self._checksum(vector) != checksum:
+                    # Slot is being reused by a concurrent writer, or the file is damaged
+                    self.corrupt += 1
+                    continue
+                found[keys[key]] = vector.tolist()
+                used.append(key)
+
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        if used:
+            now = time.time()
+            with db:
+                db.executemany("UPDATE entries SET last_used = ? WHERE key = ?", [(now, key) for key in used])
+        return found
+
+    def put_many(self, embeddings: Mapping[str, Sequence[float]]) -> None:
+        """Store embeddings by text, evicting the least recently used entries when full"""
+        items = {self.key(text): vector for text, vector in embeddings.items()}
+        # More new vectors than slots: keep the last ones
+        keys = list(items)[-self.capacity:]
+        if not keys:
+            return
+
+        with self._write_lock():
+            db = self._db()
+            now = time.time()
+            with db:
+                existing: Dict[str, int] = {}
+                for start in range(0, len(keys), LOOKUP_BATCH):
+                    batch = keys[start:start + LOOKUP_BATCH]
+                    existing.update(db.execute(
+                        f"SELECT key, slot FROM entries WHERE key IN ({','.join('?' * len(batch))})", batch
+                    ))
+                new_keys = [key for key in keys if key not in existing]
+                # Entries that are stored again count as used, so they are not evicted below
+                db.executemany("UPDATE entries SET last_used = ? WHERE key = ?", [(now, key) for key in existing])
+
+                # Fresh slots first, then slots of the least recently used entries
+                next_slot = self._meta(db, "next_slot")
+                fresh = min(len(new_keys), self.capacity - next_slot)
+                slots = list(range(next_slot, next_slot + fresh))
+                evicted = []
+                if len(new_keys) > fresh:
+                    evicted = db.execute(
+                        "SELECT key, slot FROM entries ORDER BY last_used LIMIT ?", (len(new_keys) - fresh,)
+                    ).fetchall()
+                    slots.extend(slot for _, slot in evicted)
+
+                # Vectors are flushed before the index points at them. Existing entries are
+                # rewritten in place, which repairs any that failed their checksum.
+                rows = []
+                for key, slot in [*existing.items(), *zip(new_keys, slots)]:
+                    vector = np.asarray(items[key], dtype=np.float32)
+                    self._vectors[slot] = vector
+                    rows.append((key, slot, self._checksum(vector), now))
+                self._vectors.flush()
+
+                db.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key, _ in evicted])
+                db.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)", rows)
+                db.execute("UPDATE meta SET value = ? WHERE name = 'next_slot'", (next_slot + fresh,))
+                db.execute("UPDATE meta SET value = value + ? WHERE name = 'entries'", (len(new_keys) - len(evicted),))
+            self.evictions += len(evicted)
+
+    def __len__(self) -> int:
+        return self._meta(self._db(), "entries")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        entries = len(self)
+        return {
+            "entries": entries,
+            "capacity": self.capacity,
+            "bytes": entries * self.dimension * 4,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "checksum_failures": self.corrupt,
+            "path": self.path
+        }
@@ -0,0 +1,95 @@
+"""
+Prometheus metrics, served at /metrics
+
+Everything here is an in-process counter or histogram (a lock and a few additions per
+observation); cache statistics are read from the caches only when /metrics is scraped.
+"""
+from typing import Dict
+
+from prometheus_client import Counter, Gauge, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+from app.utils.cache import LRUCache
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Steps of /embed, /embed-batch, /upload-document and /retrieve, including time queued in a stage
+STEP_SECONDS = Histogram(
+    "contextmore_step_seconds", "Latency of each processing step", ["step"], buckets=LATENCY_BUCKETS
+)
+
+# Stage executors: time waiting for a worker, time running, tasks pending and rejected
+EXECUTOR_WAIT_SECONDS = Histogram(
+    "contextmore_executor_wait_seconds", "Time tasks wait for a stage worker", ["stage"], buckets=LATENCY_BUCKETS
+)
+EXECUTOR_RUN_SECONDS = Histogram(
+    "contextmore_executor_run_seconds", "Time tasks run on a stage worker", ["stage"], buckets=LATENCY_BUCKETS
+)
+EXECUTOR_PENDING = Gauge("contextmore_executor_pending", "Tasks running or queued in a stage", ["stage"])
+EXECUTOR_REJECTED = Counter("contextmore_executor_rejected_total", "Tasks rejected because a stage was saturated", ["stage"])
+
+ENCODE_BATCH_SIZE = Histogram(
+    "contextmore_encode_batch_size", "Texts per model call", ["kind"],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+)
+# Bulk encoding: chunks/sec is rate(encoded_texts_total) / rate(encode_seconds_total),
+# padding overhead is rate(encode_padded_tokens_total) / rate(encode_tokens_total)
+ENCODED_TEXTS = Counter("contextmore_encoded_texts_total", "Texts encoded", ["kind"])
+ENCODE_TOKENS = Counter("contextmore_encode_tokens_total", "Tokens in encoded texts", ["kind"])
+ENCODE_PADDED_TOKENS = Counter("contextmore_encode_padded_tokens_total", "Tokens processed including padding", ["kind"])
+ENCODE_SECONDS = Counter("contextmore_encode_seconds_total", "Time spent in model calls", ["kind"])
+CHUNKS_PER_DOCUMENT = Histogram(
+    "contextmore_chunks_per_document", "Chunks produced per ingested document",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+)
+
+# Ingestion jobs: queue depth and run time by outcome
+JOBS_QUEUED = Gauge("contextmore_jobs_queued", "Ingestion jobs waiting for a worker")
+JOB_SECONDS = Histogram(
+    "contextmore_job_seconds", "Run time of ingestion jobs", ["kind", "status"], buckets=LATENCY_BUCKETS
+)
+
+QDRANT_SECONDS = Histogram(
+    "contextmore_qdrant_seconds", "Latency of Qdrant calls", ["operation"], buckets=LATENCY_BUCKETS
+)
+
+# Requests by route; MCP tool calls reach the app through fastapi_mcp's in-process client
+HTTP_REQUEST_SECONDS = Histogram(
+    "contextmore_http_request_seconds", "HTTP request latency", ["transport", "method", "route", "status"],
+    buckets=LATENCY_BUCKETS
+)
+
+
+def step_timer(step: str):
+    """Context manager timing one processing step"""
+    return STEP_SECONDS.labels(step).time()
+
+
+def qdrant_timer(operation: str):
+    """Context manager timing one Qdrant call"""
+    return QDRANT_SECONDS.labels(operation).time()
+
+
+class CacheCollector(Collector):
+    """Exposes LRUCache statistics at scrape time"""
+
+    def __init__(self, caches: Dict[str, LRUCache]):
+        self.caches = caches
+
+    def collect(self):
+        hits = CounterMetricFamily("contextmore_cache_hits", "Cache hits", labels=["cache"])
+        misses = CounterMetricFamily("contextmore_cache_misses", "Cache misses", labels=["cache"])
+        evictions = CounterMetricFamily("contextmore_cache_evictions", "Cache evictions", labels=["cache"])
+        entries = GaugeMetricFamily("contextmore_cache_entries", "Cached entries", labels=["cache"])
+        size = GaugeMetricFamily("contextmore_cache_bytes", "Estimated cached bytes", labels=["cache"])
+        hit_rate = GaugeMetricFamily("contextmore_cache_hit_rate", "Hits / lookups since start", labels=["cache"])
+        for name, cache in self.caches.items():
+            stats = cache.stats()
+            hits.add_metric([name], stats["hits"])
+            misses.add_metric([name], stats["misses"])
+            evictions.add_metric([name], stats["evictions"])
+            entries.add_metric([name], stats["entries"])
+            size.add_metric([name], stats["bytes"])
+            hit_rate.add_metric([name], stats["hit_rate"])
+        return [hits, misses, evictions, entries, size, hit_rate]
@@ -0,0 +1,57 @@
+import json
+from typing import Iterable
+
+from fastapi import HTTPException
+
+# Room for the multipart boundaries and the other form fields around an uploaded file
+MULTIPART_OVERHEAD_BYTES = 1024 * 1024
+
+
+class BodySizeLimitMiddleware:
+    """
+    ASGI middleware that caps the request body size on the given paths
+
+    Requests whose Content-Length is over the limit get 413 before any of the body is
+    read. Bodies without a Content-Length (chunked uploads) are counted as they stream
+    in, and reading stops with 413 as soon as the limit is passed, so an oversized
+    upload is never spooled to disk in full.
+    """
+
+    def __init__(self, app, max_bytes: int, paths: Iterable[str]):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.paths = set(paths)
+
+    def _detail(self, size: int) -> str:
+        return f"Request body too large: {size} bytes. Maximum upload size is {self.max_bytes} bytes"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        limit = self.max_bytes + MULTIPART_OVERHEAD_BYTES
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            body = json.dumps({"detail": self._detail(int(content_length))}).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 413,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Raised inside body parsing, so FastAPI turns it into the 413 response
+                    raise HTTPException(status_code=413, detail=self._detail(received))
+            return message
+
+        await self.app(scope, limited_receive, send)
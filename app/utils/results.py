@@ -0,0 +1,54 @@
+from typing import Any, Dict, List
+
+
+def format_grouped_results(groups) -> List[Dict[str, Any]]:
+    """
+    Turn a query_points_groups response into /retrieve documents
+
+    Each document lists its chunks in reading order; documents are sorted by the
+    average score of their chunks.
+    """
+    results = []
+    for group in groups.groups:
+        first = group.hits[0].payload
+        chunks = [
+            {
+                "text": hit.payload["text"],
+                "chunk_id": hit.payload["chunk_id"],
+                "score": hit.score
+            }
+            for hit in group.hits
+        ]
+        chunks.sort(key=lambda x: x["chunk_id"])
+        results.append({
+            "doc_id": group.id,
+            "call_name": first["call_name"],
+            "url": first["url"],
+            "date": first["date"],
+            "chunks": chunks,
+            "total_chunks": first["total_chunks"],
+            "avg_score": sum(hit.score for hit in group.hits) / len(group.hits),
+            "file_name": first.get("file_name", None)
+        })
+
+    results.sort(key=lambda x: x["avg_score"], reverse=True)
+    return results
+
+
+def format_chunk_results(search_results) -> List[Dict[str, Any]]:
+    """Turn a query_points response into /retrieve chunks, best first"""
+    results = []
+    for hit in search_results.points:
+        results.append({
+            "text": hit.payload["text"],
+            "url": hit.payload["url"],
+            "call_name": hit.payload["call_name"],
+            "doc_id": hit.payload["doc_id"],
+            "chunk_id": hit.payload["chunk_id"],
+            "date": hit.payload["date"],
+            "score": hit.score,
+            "file_name": hit.payload.get("file_name", None)
+        })
+
+    results.sort(key=lambda x: x["score"], reverse=True)
+    return results
@@ -0,0 +1,8 @@
+"""Performance benchmarks for ContextMore (run with `python -m benchmarks.<name>`)"""
+from typing import List
+
+
+def percentile(values: List[float], percent: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))
+    return ordered[index]
@@ -0,0 +1,101 @@
+"""Deterministic synthetic PDF, DOCX, TXT and HTML documents for offline benchmarks"""
+import io
+import random
+from typing import Dict, List
+
+from docx import Document as DocxDocument
+
+SYLLABLES = ["sui", "move", "ob", "ject", "val", "ida", "tor", "stake", "coin", "gas",
+             "net", "work", "chain", "lay", "er", "tran", "sac", "tion", "node", "epoch"]
+
+
+def make_words(rng: random.Random, count: int) -> List[str]:
+    return ["".join(rng.choices(SYLLABLES, k=rng.randint(1, 3))) for _ in range(count)]
+
+
+def make_pages(rng: random.Random, pages: int, words_per_page: int) -> List[List[str]]:
+    """Pages of lines of about 12 words"""
+    result = []
+    for _ in range(pages):
+        words = make_words(rng, words_per_page)
+        result.append([" ".join(words[i:i + 12]) for i in range(0, len(words), 12)])
+    return result
+
+
+def make_pdf(pages: List[List[str]]) -> bytes:
+    """A minimal PDF with one text stream per page, readable by PyPDF2"""
+    objects = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    catalog = add(b"")
+    pages_id = add(b"")
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    page_ids = []
+    for lines in pages:
+        text = b" T* ".join(b"(" + line.encode("latin-1") + b") Tj" for line in lines)
+        stream = b"BT /F1 10 Tf 12 TL 40 800 Td " + text + b" ET"
+        content = add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (pages_id, font, content)
+        ))
+    objects[catalog - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id
+    kids = b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+    objects[pages_id - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref))
+    return out.getvalue()
+
+
+def make_docx(pages: List[List[str]]) -> bytes:
+    document = DocxDocument()
+    for lines in pages:
+        for line in lines:
+            document.add_paragraph(line)
+    out = io.BytesIO()
+    document.save(out)
+    return out.getvalue()
+
+
+def make_html(pages: List[List[str]]) -> str:
+    body = "".join(
+        "<section><h2>Section</h2>" + "".join(f"<p>{line}</p>" for line in lines) + "</section>"
+        for lines in pages
+    )
+    return f"<html><head><style>p {{margin: 0}}</style><script>var x = 1;</script></head><body>{body}</body></html>"
+
+
+def make_corpus(docs_per_type: int, pages: int, words_per_page: int, seed: int = 0) -> Dict[str, List[Dict]]:
+    """
+    Build `docs_per_type` documents of each format
+
+    Returns {"pdf"|"docx"|"txt"|"html": [{"name", "data"}]}; data is bytes except for HTML.
+    """
+    rng = random.Random(seed)
+    corpus = {"pdf": [], "docx": [], "txt": [], "html": []}
+    for i in range(docs_per_type):
+        for file_type in corpus:
+            doc_pages = make_pages(rng, pages, words_per_page)
+            if file_type == "pdf":
+                data = make_pdf(doc_pages)
+            elif file_type == "docx":
+                data = make_docx(doc_pages)
+            elif file_type == "txt":
+                data = "\n\n".join("\n".join(lines) for lines in doc_pages).encode("utf-8")
+            else:
+                data = make_html(doc_pages)
+            corpus[file_type].append({"name": f"doc{i}.{file_type}", "data": data})
+    return corpus
@@ -0,0 +1,102 @@
+"""
+Encoder backend benchmark and parity check
+
+Encodes the same chunks with PyTorch (the baseline) and each requested backend,
+reports throughput per backend and the cosine similarity of every embedding to
+its PyTorch counterpart, and exits non-zero if any falls below --min-cosine:
+
+    python -m benchmarks.encoder_backends --backends onnx onnx-int8 --threads 4
+    python -m benchmarks.encoder_backends --source docs.txt --min-cosine 0.99
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+from app.config.settings import MODEL_BACKENDS, MODEL_NAME
+from app.services.model_loader import load_model
+
+from benchmarks.corpus import make_words
+
+
+def sample_chunks(count: int, words_per_chunk: int, source: str = None, seed: int = 0) -> List[str]:
+    """Chunks cut from a text file, or synthetic ones when no source is given"""
+    rng = random.Random(seed)
+    if source:
+        with open(source, encoding="utf-8") as f:
+            words = f.read().split()
+        if len(words) <= words_per_chunk:
+            raise ValueError(f"{source} has fewer than {words_per_chunk} words")
+        starts = [rng.randrange(len(words) - words_per_chunk) for _ in range(count)]
+        return [" ".join(words[start:start + words_per_chunk]) for start in starts]
+    return [" ".join(make_words(rng, words_per_chunk)) for _ in range(count)]
+
+
+def run_backend(backend: str, chunks: List[str], batch_size: int, threads: int) -> Dict[str, Any]:
+    started = time.perf_counter()
+    model = load_model(MODEL_NAME, backend, intra_op_threads=threads)
+    load_seconds = time.perf_counter() - started
+
+    model.encode(chunks[:batch_size], batch_size=batch_size)  # warmup
+    started = time.perf_counter()
+    embeddings = model.encode(chunks, batch_size=batch_size, normalize_embeddings=True)
+    seconds = time.perf_counter() - started
+    return {
+        "backend": backend,
+        "load_seconds": load_seconds,
+        "encode_seconds": seconds,
+        "chunks_per_sec": len(chunks) / seconds,
+        "chunks_per_sec_per_thread": len(chunks) / seconds / threads if threads else None,
+        "embeddings": embeddings
+    }
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Compare encoder inference backends against PyTorch")
+    parser.add_argument("--backends", nargs="+", choices=MODEL_BACKENDS, default=["onnx", "onnx-int8"],
+                        help="Backends to compare with the torch baseline")
+    parser.add_argument("--chunks", type=int, default=512, help="Chunks to encode")
+    parser.add_argument("--words-per-chunk", type=int, default=300, help="Words per chunk")
+    parser.add_argument("--batch-size", type=int, default=32, help="Chunks per encode batch")
+    parser.add_argument("--threads", type=int, default=0, help="Intra-op threads per backend (0: library default)")
+    parser.add_argument("--source", type=str, help="Sample chunks from this text file instead of synthetic text")
+    parser.add_argument("--min-cosine", type=float, default=0.98,
+                        help="Fail when any embedding's cosine similarity to PyTorch is below this")
+    parser.add_argument("--output", type=str, help="Write results as JSON to this file")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    chunks = sample_chunks(args.chunks, args.words_per_chunk, args.source)
+
+    baseline = run_backend("torch", chunks, args.batch_size, args.threads)
+    reference = baseline.pop("embeddings")
+    results = []
+    failed = False
+    for backend in ["torch"] + [b for b in args.backends if b != "torch"]:
+        result = baseline if backend == "torch" else run_backend(backend, chunks, args.batch_size, args.threads)
+        # Embeddings are normalized, so the row-wise dot product is the cosine similarity
+        cosines = np.sum(result.pop("embeddings", reference) * reference, axis=1)
+        result.update({
+            "speedup": result["chunks_per_sec"] / baseline["chunks_per_sec"],
+            "cosine_min": float(cosines.min()),
+            "cosine_mean": float(cosines.mean()),
+            "parity": bool(cosines.min() >= args.min_cosine)
+        })
+        failed = failed or not result["parity"]
+        results.append(result)
+        print(
+            f"{backend:>9}: {result['chunks_per_sec']:8.1f} chunks/s ({result['speedup']:.2f}x), "
+            f"cosine vs torch min {result['cosine_min']:.4f} mean {result['cosine_mean']:.4f}"
+            f"{'' if result['parity'] else '  BELOW TOLERANCE'}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    sys.exit(1 if failed else 0)
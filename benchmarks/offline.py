@@ -0,0 +1,225 @@
+"""
+Offline ingestion and retrieval benchmark
+
+Runs entirely in-process: Qdrant in local mode (in memory, or on disk with
+--qdrant-path) and a deterministic stub encoder unless --encoder model is given.
+A synthetic PDF/DOCX/TXT/HTML corpus is pushed through each stage, and the timings
+are written as JSON so runs can be compared between commits:
+
+    python -m benchmarks.offline --output before.json
+    python -m benchmarks.offline --encoder model --docs-per-type 10 --output after.json
+"""
+import argparse
+import io
+import json
+import platform
+import statistics
+import subprocess
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+from qdrant_client import QdrantClient
+
+from app.config.settings import EMBEDDING_STORE_MAX_BYTES, ENCODE_TOKEN_BUDGET, MODEL_BACKEND, MODEL_BACKENDS, MODEL_NAME, SEARCH_GROUP_SIZE
+from app.services.document_service import DocumentService
+from app.services.encoder_pool import EncoderPool
+from app.utils.embedding_store import EmbeddingStore
+from app.services.qdrant_service import QdrantService
+from app.services.text_service import TextService
+from app.utils.results import format_grouped_results
+
+from benchmarks.corpus import make_corpus
+from benchmarks import percentile
+from benchmarks.stub_encoder import StubEncoder
+
+
+def _throughput(seconds: float, items: int, **extra: Any) -> Dict[str, Any]:
+    return {"seconds": seconds, "items": items, "items_per_sec": items / seconds if seconds else 0.0, **extra}
+
+
+def _latencies(values: List[float]) -> Dict[str, Any]:
+    return {
+        "count": len(values),
+        "ms_mean": statistics.mean(values),
+        "ms_p50": percentile(values, 50),
+        "ms_p95": percentile(values, 95),
+        "ms_p99": percentile(values, 99)
+    }
+
+
+def _time_each(func: Callable[[Any], Any], items: List[Any]):
+    """Call func on every item; return the results and per-call latencies in ms"""
+    results = []
+    latencies = []
+    for item in items:
+        started = time.perf_counter()
+        results.append(func(item))
+        latencies.append((time.perf_counter() - started) * 1000)
+    return results, latencies
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(args) -> Dict[str, Any]:
+    model = StubEncoder() if args.encoder == "stub" else None
+    text_service = TextService(model=model, backend=args.backend, token_budget=args.token_budget)
+    if args.encoder_processes:
+        # Workers build their own replica: a stub, or the model with the chosen backend
+        text_service.encoder_pool = EncoderPool(
+            args.encoder_processes, backend=args.backend, model_factory=StubEncoder if model else None
+        )
+        text_service.encoder_pool.start()
+    client = QdrantClient(path=args.qdrant_path) if args.qdrant_path else QdrantClient(":memory:")
+    qdrant_service = QdrantService(
+        vector_size=text_service.vector_size,
+        collection_name=f"bench_offline_{uuid.uuid4().hex[:8]}",
+        client=client
+    )
+    corpus = make_corpus(args.docs_per_type, args.pages, args.words_per_page, seed=args.seed)
+    stages: Dict[str, Any] = {}
+
+    # Extraction, per format
+    documents = []
+    for file_type, files in corpus.items():
+        if file_type == "html":
+            extract = lambda f: text_service.extract_text_from_html(f["data"])
+        else:
+            extract = lambda f: "\n\n".join(
+                text for _, text in DocumentService.iter_file_segments(io.BytesIO(f["data"]), f["name"])
+            )
+        texts, latencies = _time_each(extract, files)
+        size = sum(len(f["data"]) for f in files)
+        stages[f"extract_{file_type}"] = {
+            **_throughput(sum(latencies) / 1000, len(files), bytes=size,
+                          mb_per_sec=size / 1e6 / (sum(latencies) / 1000)),
+            **_latencies(latencies)
+        }
+        documents.extend((file_type, f["name"], text) for (f, text) in zip(files, texts))
+
+    # Chunking
+    chunked, latencies = _time_each(lambda document: text_service.chunk_text(document[2]), documents)
+    chunk_count = sum(len(chunks) for chunks in chunked)
+    stages["chunk_text"] = _throughput(sum(latencies) / 1000, chunk_count, documents=len(documents))
+
+    # Encoding
+    texts = [chunk for chunks in chunked for chunk in chunks]
+    started = time.perf_counter()
+    embeddings = []
+    for start in range(0, len(texts), args.batch_size):
+        embeddings.extend(text_service.generate_embeddings(texts[start:start + args.batch_size]))
+    stages["generate_embeddings"] = _throughput(time.perf_counter() - started, len(texts), batch_size=args.batch_size)
+
+    # Bulk encoding of every chunk at once, with the padding the batches incur
+    batches, lengths = text_service.plan_encode_batches(texts)
+    started = time.perf_counter()
+    text_service.encode_bulk(texts)
+    stages["encode_bulk"] = _throughput(
+        time.perf_counter() - started, len(texts), token_budget=text_service.token_budget, model_calls=len(batches),
+        padding_ratio=sum(len(batch) * lengths[batch[0]] for batch in batches) / max(1, sum(lengths))
+    )
+
+    # Re-ingesting the same chunks through the persistent embedding store: the first
+    # pass fills it, the second only reads it
+    if args.embedding_store:
+        text_service.embedding_store = EmbeddingStore(
+            args.embedding_store, "stub-encoder" if model else MODEL_NAME, args.backend,
+            text_service.vector_size, EMBEDDING_STORE_MAX_BYTES
+        )
+        for stage in ("embedding_store_fill", "embedding_store_reingest"):
+            started = time.perf_counter()
+            for start in range(0, len(texts), args.batch_size):
+                text_service.generate_embeddings(texts[start:start + args.batch_size])
+            stages[stage] = _throughput(time.perf_counter() - started, len(texts), batch_size=args.batch_size)
+
+    # Upserts (local mode is not thread-safe, so batches are sent one at a time)
+    points = []
+    date = datetime.now().isoformat()
+    embedding_iter = iter(embeddings)
+    for (file_type, name, _), chunks in zip(documents, chunked):
+        doc_id = str(uuid.uuid4())
+        for i, chunk in enumerate(chunks):
+            points.append({
+                "id": str(uuid.uuid4()),
+                "vector": next(embedding_iter),
+                "payload": {
+                    "url": f"file://{name}", "call_name": name, "date": date, "file_name": name,
+                    "file_type": file_type, "text": chunk, "doc_id": doc_id, "chunk_id": i,
+                    "total_chunks": len(chunks)
+                }
+            })
+    started = time.perf_counter()
+    qdrant_service.upsert_points(points, parallelism=1)
+    stages["upsert_points"] = _throughput(time.perf_counter() - started, len(points))
+
+    # Retrieval: queries are the opening words of random chunks
+    step = max(1, len(texts) // args.queries)
+    queries = [" ".join(text.split()[:8]) for text in texts[::step][:args.queries]]
+    query_vectors = text_service.generate_embeddings(queries)
+
+    _, latencies = _time_each(lambda vector: qdrant_service.search_points(vector, limit=args.top_k), query_vectors)
+    stages["search_points"] = _latencies(latencies)
+
+    groups, latencies = _time_each(
+        lambda vector: qdrant_service.search_groups(vector, limit=args.top_k, group_size=SEARCH_GROUP_SIZE),
+        query_vectors
+    )
+    stages["search_groups"] = _latencies(latencies)
+    _, latencies = _time_each(format_grouped_results, groups)
+    stages["format_grouped_results"] = _latencies(latencies)
+
+    client.close()
+    if text_service.encoder_pool is not None:
+        text_service.encoder_pool.shutdown()
+    return {
+        "commit": _git_commit(),
+        "date": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "corpus": {"documents": len(documents), "chunks": chunk_count},
+        "stages": stages
+    }
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Offline ingestion and retrieval benchmark")
+    parser.add_argument("--encoder", choices=["stub", "model"], default="stub",
+                        help="Deterministic stub encoder (default) or the configured model")
+    parser.add_argument("--backend", choices=MODEL_BACKENDS, default=MODEL_BACKEND,
+                        help="Inference backend for --encoder model")
+    parser.add_argument("--encoder-processes", type=int, default=0,
+                        help="Encode documents in this many worker processes (0: in-process)")
+    parser.add_argument("--embedding-store", type=str,
+                        help="Also time filling and re-reading a persistent embedding store in this directory")
+    parser.add_argument("--qdrant-path", type=str, help="Use on-disk local Qdrant at this path instead of memory")
+    parser.add_argument("--docs-per-type", type=int, default=20, help="Documents generated per format")
+    parser.add_argument("--pages", type=int, default=10, help="Pages (sections) per document")
+    parser.add_argument("--words-per-page", type=int, default=400, help="Words per page")
+    parser.add_argument("--batch-size", type=int, default=64, help="Chunks per generate_embeddings call")
+    parser.add_argument("--token-budget", type=int, default=ENCODE_TOKEN_BUDGET,
+                        help="Padded tokens per model call in bulk encoding")
+    parser.add_argument("--queries", type=int, default=200, help="Search queries")
+    parser.add_argument("--top-k", type=int, default=5, help="Results (documents when grouped) per search")
+    parser.add_argument("--seed", type=int, default=0, help="Corpus seed")
+    parser.add_argument("--output", type=str, help="Write results as JSON to this file")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    report = run(args)
+    for stage, values in report["stages"].items():
+        if "items_per_sec" in values:
+            print(f"{stage:>24}: {values['items_per_sec']:10.1f} items/s ({values['items']} in {values['seconds']:.3f}s)")
+        else:
+            print(f"{stage:>24}: p50 {values['ms_p50']:.2f} ms, p95 {values['ms_p95']:.2f} ms")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
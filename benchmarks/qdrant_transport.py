@@ -0,0 +1,100 @@
+"""
+REST vs gRPC transport benchmark against a running Qdrant server
+
+Upserts random vectors of each size into a scratch collection and measures upsert
+throughput and search latency for both transports:
+
+    python -m benchmarks.qdrant_transport --dims 768 3072 --points 5000 --queries 500
+"""
+import argparse
+import json
+import statistics
+import time
+import uuid
+from typing import Any, Dict
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.http import models
+
+from app.config.settings import QDRANT_URL
+from app.services.qdrant_service import client_options
+
+from benchmarks import percentile
+
+
+def run_transport(transport: str, dim: int, vectors: np.ndarray, queries: np.ndarray,
+                  batch_size: int, top_k: int) -> Dict[str, Any]:
+    client = QdrantClient(QDRANT_URL, **client_options(prefer_grpc=transport == "grpc"))
+    collection_name = f"bench_transport_{transport}_{dim}_{uuid.uuid4().hex[:8]}"
+    client.create_collection(
+        collection_name=collection_name,
+        vectors_config=models.VectorParams(size=dim, distance=models.Distance.COSINE)
+    )
+    try:
+        payload = {"text": "x" * 1500, "doc_id": str(uuid.uuid4()), "url": "file://bench.txt"}
+        started = time.perf_counter()
+        for start in range(0, len(vectors), batch_size):
+            batch = vectors[start:start + batch_size]
+            client.upsert(
+                collection_name=collection_name,
+                points=[
+                    models.PointStruct(id=start + i, vector=vector.tolist(), payload=payload)
+                    for i, vector in enumerate(batch)
+                ],
+                wait=True
+            )
+        upsert_seconds = time.perf_counter() - started
+
+        latencies = []
+        for query in queries:
+            started = time.perf_counter()
+            client.query_points(collection_name=collection_name, query=query.tolist(), limit=top_k)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+        return {
+            "transport": transport,
+            "dim": dim,
+            "points": len(vectors),
+            "upsert_points_per_sec": len(vectors) / upsert_seconds,
+            "search_ms_mean": statistics.mean(latencies),
+            "search_ms_p50": percentile(latencies, 50),
+            "search_ms_p95": percentile(latencies, 95),
+            "search_ms_p99": percentile(latencies, 99)
+        }
+    finally:
+        client.delete_collection(collection_name=collection_name)
+        client.close()
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Compare Qdrant REST and gRPC transports")
+    parser.add_argument("--dims", type=int, nargs="+", default=[768, 3072], help="Vector sizes to test")
+    parser.add_argument("--points", type=int, default=5000, help="Points upserted per run")
+    parser.add_argument("--queries", type=int, default=500, help="Searches per run")
+    parser.add_argument("--batch-size", type=int, default=128, help="Points per upsert request")
+    parser.add_argument("--top-k", type=int, default=20, help="Results per search")
+    parser.add_argument("--output", type=str, help="Write results as JSON to this file")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    rng = np.random.default_rng(0)
+
+    results = []
+    for dim in args.dims:
+        vectors = rng.standard_normal((args.points, dim), dtype=np.float32)
+        queries = rng.standard_normal((args.queries, dim), dtype=np.float32)
+        for transport in ("rest", "grpc"):
+            result = run_transport(transport, dim, vectors, queries, args.batch_size, args.top_k)
+            results.append(result)
+            print(
+                f"{transport:>4} {dim:>5}-d: {result['upsert_points_per_sec']:8.0f} points/s upsert, "
+                f"search p50 {result['search_ms_p50']:.2f} ms, p95 {result['search_ms_p95']:.2f} ms, "
+                f"p99 {result['search_ms_p99']:.2f} ms"
+            )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,142 @@
+"""
+Recall vs latency of the collection storage profiles against a running Qdrant server
+
+Loads the same vectors into one scratch collection per profile, then compares each
+profile's top-k results with exact (brute force, full precision) search:
+
+    python -m benchmarks.storage_profiles --points 20000 --queries 200
+    python -m benchmarks.storage_profiles --source contextmore --points 20000
+
+With --source, vectors are sampled from an existing collection (real embeddings
+quantize very differently from random ones); otherwise clustered synthetic vectors
+of --dim dimensions are used. Queries are held-out vectors from the same data.
+"""
+import argparse
+import json
+import statistics
+import time
+import uuid
+from typing import Any, Dict, List
+
+import numpy as np
+from qdrant_client.http import models
+
+from app.config.settings import STORAGE_PROFILES
+from app.services.qdrant_service import QdrantService
+
+from benchmarks import percentile
+
+
+def load_vectors(source: str, count: int, dim: int, seed: int) -> np.ndarray:
+    if source:
+        service = QdrantService(vector_size=0, collection_name=source, ensure_collection=False)
+        vectors = []
+        offset = None
+        while len(vectors) < count:
+            records, offset = service.client.scroll(
+                collection_name=source, limit=1000, offset=offset, with_payload=False, with_vectors=True
+            )
+            vectors.extend(record.vector for record in records)
+            if offset is None:
+                break
+        service.client.close()
+        return np.asarray(vectors[:count], dtype=np.float32)
+
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((64, dim), dtype=np.float32)
+    assignments = rng.integers(0, len(centers), count)
+    return centers[assignments] + 0.35 * rng.standard_normal((count, dim), dtype=np.float32)
+
+
+def wait_until_indexed(service: QdrantService, timeout: float = 600):
+    """Wait for the optimizers to finish building the HNSW graph and quantized vectors"""
+    started = time.monotonic()
+    while time.monotonic() - started < timeout:
+        info = service.client.get_collection(service.collection_name)
+        if info.status == models.CollectionStatus.GREEN and (info.indexed_vectors_count or 0) >= (info.points_count or 0):
+            return
+        time.sleep(1)
+    print(f"Warning: {service.collection_name} still indexing after {timeout:.0f}s")
+
+
+def run_profile(name: str, vectors: np.ndarray, queries: np.ndarray, exact: List[List[int]], top_k: int) -> Dict[str, Any]:
+    service = QdrantService(
+        vector_size=vectors.shape[1],
+        collection_name=f"bench_profile_{name}_{uuid.uuid4().hex[:8]}",
+        ensure_collection=False,
+        profile=name
+    )
+    service._create_collection()
+    try:
+        # Build the HNSW index even for small benchmark collections
+        service.client.update_collection(
+            collection_name=service.collection_name,
+            optimizers_config=models.OptimizersConfigDiff(indexing_threshold=1)
+        )
+        service.upsert_points(
+            [{"id": i, "vector": vector.tolist(), "payload": {}} for i, vector in enumerate(vectors)]
+        )
+        wait_until_indexed(service)
+
+        latencies = []
+        recalls = []
+        for query, expected in zip(queries, exact):
+            started = time.perf_counter()
+            hits = service.search_points(query.tolist(), limit=top_k).points
+            latencies.append((time.perf_counter() - started) * 1000)
+            recalls.append(len({hit.id for hit in hits} & set(expected)) / top_k)
+
+        return {
+            "profile": name,
+            **STORAGE_PROFILES[name],
+            "points": len(vectors),
+            "dim": vectors.shape[1],
+            f"recall_at_{top_k}": statistics.mean(recalls),
+            "search_ms_p50": percentile(latencies, 50),
+            "search_ms_p95": percentile(latencies, 95),
+            "search_ms_p99": percentile(latencies, 99)
+        }
+    finally:
+        service.client.delete_collection(collection_name=service.collection_name)
+        service.client.close()
+
+
+def exact_neighbours(vectors: np.ndarray, queries: np.ndarray, top_k: int) -> List[List[int]]:
+    """Full-precision cosine top-k, the baseline every profile is compared against"""
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    scores = (queries / np.linalg.norm(queries, axis=1, keepdims=True)) @ normalized.T
+    return np.argsort(-scores, axis=1)[:, :top_k].tolist()
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Compare recall and latency of collection storage profiles")
+    parser.add_argument("--profiles", nargs="+", default=list(STORAGE_PROFILES), choices=list(STORAGE_PROFILES),
+                        help="Profiles to test (default: all)")
+    parser.add_argument("--source", type=str, help="Sample vectors from this collection instead of synthetic data")
+    parser.add_argument("--dim", type=int, default=768, help="Size of synthetic vectors")
+    parser.add_argument("--points", type=int, default=20000, help="Points loaded per profile")
+    parser.add_argument("--queries", type=int, default=200, help="Held-out query vectors")
+    parser.add_argument("--top-k", type=int, default=10, help="Results per search")
+    parser.add_argument("--output", type=str, help="Write results as JSON to this file")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    data = load_vectors(args.source, args.points + args.queries, args.dim, seed=0)
+    vectors, queries = data[:-args.queries], data[-args.queries:]
+    exact = exact_neighbours(vectors, queries, args.top_k)
+
+    results = []
+    for name in args.profiles:
+        result = run_profile(name, vectors, queries, exact, args.top_k)
+        results.append(result)
+        print(
+            f"{name:>12}: recall@{args.top_k} {result[f'recall_at_{args.top_k}']:.3f}, "
+            f"search p50 {result['search_ms_p50']:.2f} ms, p95 {result['search_ms_p95']:.2f} ms, "
+            f"p99 {result['search_ms_p99']:.2f} ms"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,28 @@
+import zlib
+from typing import List, Union
+
+import numpy as np
+
+
+class StubEncoder:
+    """
+    Deterministic stand-in for SentenceTransformer
+
+    Each text maps to a fixed pseudo-random unit vector seeded by its CRC32, so runs are
+    reproducible and encoding cost stays negligible next to the stages being measured.
+    """
+
+    def __init__(self, dimension: int = 768):
+        self.dimension = dimension
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def encode(self, texts: Union[str, List[str]], **kwargs) -> np.ndarray:
+        single = isinstance(texts, str)
+        vectors = np.stack([
+            np.random.default_rng(zlib.crc32(text.encode("utf-8"))).standard_normal(self.dimension, dtype=np.float32)
+            for text in ([texts] if single else texts)
+        ]) if texts else np.zeros((0, self.dimension), dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+        return vectors[0] if single else vectors
@@ -0,0 +1,160 @@
+import argparse
+import logging
+import sys
+from datetime import datetime
+from typing import Optional
+
+from qdrant_client.http import models
+
+from app.config.settings import QDRANT_COLLECTION_NAME, STORAGE_PROFILE, STORAGE_PROFILES
+from app.services.qdrant_service import QdrantService
+
+# Setup logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+logger = logging.getLogger(__name__)
+
+
+def _model_dimension() -> int:
+    """Load the configured model to read its native embedding size"""
+    from app.services.text_service import TextService
+    return TextService().vector_size
+
+
+def _copy_points(service: QdrantService, source: str, dim: int, batch_size: int,
+                 scroll_filter: Optional[models.Filter] = None) -> int:
+    """Copy points from `source` into the service's collection, keeping the first `dim` components"""
+    copied = 0
+    offset = None
+    while True:
+        records, offset = service.client.scroll(
+            collection_name=source,
+            scroll_filter=scroll_filter,
+            limit=batch_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True
+        )
+        if not records:
+            break
+
+        points = []
+        for record in records:
+            vector = record.vector
+            # Tiled vectors repeat the native embedding; anything else would be silently truncated
+            if vector[dim:2 * dim] != vector[:dim]:
+                raise ValueError(f"Point {record.id} in {source} is not a tiled {dim}-d embedding")
+            points.append(models.PointStruct(id=record.id, vector=vector[:dim], payload=record.payload))
+
+        service.client.upsert(collection_name=service.collection_name, points=points)
+        copied += len(points)
+        logger.info(f"Copied {copied} points")
+
+        if offset is None:
+            break
+    return copied
+
+
+def migrate_dimensions(source: str, target: Optional[str], dim: Optional[int], batch_size: int, swap: bool) -> None:
+    """
+    Rewrite a collection of tiled vectors into a native-dimension collection
+
+    The source collection keeps serving traffic during the copy. Documents that are
+    (re)ingested meanwhile are copied again in a catch-up pass before the optional swap.
+    """
+    dim = dim or _model_dimension()
+    target = target or f"{source}_{dim}"
+    service = QdrantService(vector_size=dim, collection_name=target, ensure_collection=False)
+
+    source_size = service.client.get_collection(source).config.params.vectors.size
+    if source_size == dim:
+        logger.info(f"Collection {source} already stores {dim}-d vectors, nothing to do")
+        return
+    if source_size % dim != 0:
+        raise ValueError(f"Cannot slice {source_size}-d vectors of {source} into {dim}-d vectors")
+    if service.client.collection_exists(target):
+        raise ValueError(f"Target collection {target} already exists")
+
+    service._create_collection()
+    started = datetime.now()
+    copied = _copy_points(service, source, dim, batch_size)
+    logger.info(f"Copied {copied} points from {source} ({source_size}-d) to {target} ({dim}-d)")
+
+    # Catch up with documents written while the copy was running
+    changed_doc_ids = set()
+    offset = None
+    while True:
+        records, offset = service.client.scroll(
+            collection_name=source,
+            scroll_filter=models.Filter(must=[
+                models.FieldCondition(key="date", range=models.DatetimeRange(gte=started))
+            ]),
+            limit=batch_size,
+            offset=offset,
+            with_payload=["doc_id"]
+        )
+        changed_doc_ids.update(record.payload["doc_id"] for record in records)
+        if offset is None:
+            break
+    changed_doc_ids = sorted(changed_doc_ids)
+    if changed_doc_ids:
+        doc_filter = models.Filter(must=[
+            models.FieldCondition(key="doc_id", match=models.MatchAny(any=changed_doc_ids))
+        ])
+        service.client.delete(collection_name=target, points_selector=models.FilterSelector(filter=doc_filter))
+        recopied = _copy_points(service, source, dim, batch_size, scroll_filter=doc_filter)
+        logger.info(f"Re-copied {recopied} points of {len(changed_doc_ids)} documents updated during the migration")
+
+    if swap:
+        # Serve the new collection under the old name
+        service.client.delete_collection(collection_name=source)
+        service.client.update_collection_aliases(change_aliases_operations=[
+            models.CreateAliasOperation(create_alias=models.CreateAlias(collection_name=target, alias_name=source))
+        ])
+        logger.info(f"Deleted {source} and created alias {source} -> {target}")
+    else:
+        logger.info(f"Set QDRANT_COLLECTION_NAME={target} or re-run with --swap to serve the migrated collection")
+
+
+def apply_profile(collection: str, profile: str) -> None:
+    """Switch an existing collection to a storage profile in place"""
+    service = QdrantService(vector_size=0, collection_name=collection, ensure_collection=False, profile=profile)
+    if not service.client.collection_exists(collection):
+        raise ValueError(f"Collection {collection} does not exist")
+    service.apply_storage_profile()
+    logger.info(f"Applied storage profile {profile} to {collection}; Qdrant re-indexes it in the background")
+    logger.info(f"Set STORAGE_PROFILE={profile} so searches use the profile's ef and rescoring settings")
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Manage the Qdrant collection")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    migrate = subparsers.add_parser("migrate-dimensions", help="Convert tiled 3072-d vectors to native-dimension vectors")
+    migrate.add_argument("--source", type=str, default=QDRANT_COLLECTION_NAME, help="Collection to migrate (default from settings)")
+    migrate.add_argument("--target", type=str, help="Name of the new collection (default: <source>_<dim>)")
+    migrate.add_argument("--dim", type=int, help="Native embedding size (default: read from the configured model)")
+    migrate.add_argument("--batch-size", type=int, default=256, help="Points copied per request")
+    migrate.add_argument("--swap", action="store_true", help="Delete the source and alias its name to the new collection")
+
+    profile = subparsers.add_parser("apply-profile", help="Apply a storage profile (quantization, on-disk vectors, HNSW) in place")
+    profile.add_argument("--collection", type=str, default=QDRANT_COLLECTION_NAME, help="Collection to update (default from settings)")
+    profile.add_argument("--profile", type=str, default=STORAGE_PROFILE, choices=list(STORAGE_PROFILES),
+                         help="Storage profile to apply (default: STORAGE_PROFILE)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+
+    try:
+        if args.command == "migrate-dimensions":
+            migrate_dimensions(args.source, args.target, args.dim, args.batch_size, args.swap)
+        elif args.command == "apply-profile":
+            apply_profile(args.collection, args.profile)
+    except ValueError as e:
+        logger.error(str(e))
+        sys.exit(1)
@@ -1,14 +1,23 @@
 import os
 import argparse
 import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
 import uuid
 from datetime import datetime
 import logging
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, Tuple
 
-from app.services.document_service import DocumentService
-from app.services.text_service import TextService
-from app.services.qdrant_service import QdrantService
+from app.config.settings import ENCODE_TOKEN_BUDGET, ENCODER_PROCESSES, ENCODER_THREADS_PER_PROCESS, MODEL_BACKEND, MODEL_BACKENDS, PDF_PARALLEL_MIN_PAGES
+from app.services.document_service import DocumentService, Segment
+
+if TYPE_CHECKING:
+    from app.services.ingestion_service import IngestionPlan, IngestionService
+    from app.services.qdrant_service import QdrantService
+    from app.services.text_service import TextService
 
 # Setup logging
 logging.basicConfig(
@@ -18,112 +27,101 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Initialize services
-document_service = DocumentService()
-text_service = TextService()
-qdrant_service = QdrantService()
-
 # Supported file extensions
 SUPPORTED_EXTENSIONS = ['.pdf', '.docx', '.txt']
 
-async def process_document(file_path, call_name=None, collection_name=None, metadata=None):
-    """Process a single document file and upload to Qdrant"""
-    try:
-        file_name = os.path.basename(file_path)
-        file_ext = os.path.splitext(file_path)[1].lower()
-        
-        if file_ext not in SUPPORTED_EXTENSIONS:
-            logger.warning(f"Unsupported file format: {file_ext} for file {file_name}")
-            return None
-        
-        logger.info(f"Processing {file_name}...")
-        
-        # Use file name as call_name if not provided
-        if not call_name:
-            call_name = os.path.splitext(file_name)[0]
-        
-        # Create a virtual document URL based on filename
-        virtual_url = f"file://{file_name}"
-        
-        # Check if a document with this name already exists
-        existing_doc_id = qdrant_service.get_existing_doc_id(virtual_url)
-        
-        # Generate a unique document ID (reuse if updating)
-        doc_id = existing_doc_id if existing_doc_id else str(uuid.uuid4())
-        current_date = datetime.now().isoformat()
-        
-        # If updating, delete existing chunks first
-        if existing_doc_id:
-            qdrant_service.delete_document_chunks(doc_id)
-            logger.info(f"Updating existing document: {file_name}")
+# Spawned extraction workers re-import this module, so the services (and the model
+# libraries behind them) are only imported and created by init_services()
+text_service: Optional["TextService"] = None
+qdrant_service: Optional["QdrantService"] = None
+ingestion_service: Optional["IngestionService"] = None
+
+def init_services(collection_name=None, backend=MODEL_BACKEND, token_budget=ENCODE_TOKEN_BUDGET,
+                  encoder_processes=ENCODER_PROCESSES, encoder_threads=ENCODER_THREADS_PER_PROCESS):
+    global text_service, qdrant_service, ingestion_service
+    from app.services.encoder_pool import EncoderPool
+    from app.services.ingestion_service import IngestionService
+    from app.services.qdrant_service import QdrantService
+    from app.services.text_service import TextService
+
+    text_service = TextService(backend=backend, token_budget=token_budget)
+    if encoder_processes > 0:
+        logger.info(f"Starting {encoder_processes} encoder processes...")
+        text_service.encoder_pool = EncoderPool(encoder_processes, encoder_threads, backend)
+        text_service.encoder_pool.start()
+    qdrant_service = QdrantService(vector_size=text_service.vector_size, collection_name=collection_name)
+    ingestion_service = IngestionService(text_service, qdrant_service)
+
+@dataclass
+class DocumentJob:
+    """A file moving through the ingestion pipeline"""
+    file_path: Path
+    call_name: str
+    doc_id: Optional[str] = None
+    is_update: bool = False
+    chunks: List[str] = field(default_factory=list)
+    plan: Optional["IngestionPlan"] = None
+    pending_chunks: int = 0
+    encode_failed: bool = False
+
+    @property
+    def file_name(self) -> str:
+        return self.file_path.name
+
+    @property
+    def file_type(self) -> str:
+        return self.file_path.suffix.lower()[1:]  # Remove the dot
+
+    @property
+    def virtual_url(self) -> str:
+        return f"file://{self.file_name}"
+
+class Progress:
+    """Pipeline counters with throughput and ETA reporting"""
+
+    def __init__(self, total_files: int):
+        self.total_files = total_files
+        self.successful = 0
+        self.failed = 0
+        self.chunks_encoded = 0
+        self.started = time.monotonic()
+
+    def report(self):
+        elapsed = time.monotonic() - self.started
+        done = self.successful + self.failed
+        files_per_sec = done / elapsed if elapsed else 0.0
+        chunks_per_sec = self.chunks_encoded / elapsed if elapsed else 0.0
+        if files_per_sec:
+            eta = f"{(self.total_files - done) / files_per_sec:.0f}s"
         else:
-            logger.info(f"Creating new document: {file_name}")
-        
-        # Extract text based on file extension
-        with open(file_path, 'rb') as f:
-            text = document_service.extract_text_from_file(f, file_name)
-        
-        # Split text into chunks and generate embeddings
-        chunks = text_service.chunk_text(text)
-        
-        if not chunks:
-            logger.warning(f"No text content extracted from {file_name}")
-            return None
-        
-        logger.info(f"Extracted {len(chunks)} chunks from {file_name}")
-        embeddings = text_service.generate_embeddings(chunks)
-        
-        # Prepare additional metadata if provided
-        payload_metadata = {}
-        if metadata:
-            payload_metadata.update(metadata)
-        
-        # Prepare points for Qdrant
-        points = []
-        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-            payload = {
-                "text": chunk,
-                "url": virtual_url,
-                "call_name": call_name,
-                "doc_id": doc_id,
-                "chunk_id": i,
-                "date": current_date,
-                "total_chunks": len(chunks),
-                "file_name": file_name,
-                "file_type": file_ext[1:],  # Remove the dot
-                **payload_metadata
-            }
-            
-            points.append({
-                "id": str(uuid.uuid4()),
-                "vector": embedding,
-                "payload": payload
-            })
-        
-        # Store in Qdrant
-        qdrant_service.upsert_points(points)
-        
-        logger.info(f"Successfully {'updated' if existing_doc_id else 'embedded'} {file_name} with {len(chunks)} chunks")
-        return {
-            "file_name": file_name,
-            "call_name": call_name,
-            "doc_id": doc_id,
-            "chunks": len(chunks),
-            "file_type": file_ext[1:]
-        }
-    except Exception as e:
-        logger.error(f"Error processing {file_path}: {str(e)}")
-        return None
-
-async def process_folder(folder_path, prefix=None, recursive=True, metadata=None, collection_name=None):
-    """Process all supported document files in a folder"""
-    if not os.path.isdir(folder_path):
-        logger.error(f"Error: {folder_path} is not a valid directory")
-        return
-    
-    folder = Path(folder_path)
-    
-    # Find all supported files
+            eta = "unknown"
+        logger.info(
+            f"Progress: {done}/{self.total_files} files ({self.failed} failed), "
+            f"{self.chunks_encoded} chunks embedded, {files_per_sec:.1f} files/s, "
+            f"{chunks_per_sec:.1f} chunks/s, ETA {eta}"
+        )
+
+def extract_document(file_path: str) -> List[Segment]:
+    """Extract (page number, text) segments from a file (runs in an extraction worker process)"""
+    with open(file_path, 'rb') as f:
+        return list(DocumentService.iter_file_segments(f, os.path.basename(file_path)))
+
+async def extract_segments(job: "DocumentJob", process_pool: ProcessPoolExecutor, workers: int,
+                           io_pool: ThreadPoolExecutor) -> List[Segment]:
+    """Extract a file, splitting large PDFs into page ranges spread over the worker processes"""
+    loop = asyncio.get_running_loop()
+    path = str(job.file_path)
+    if job.file_type == 'pdf':
+        page_count = await loop.run_in_executor(io_pool, DocumentService.count_pdf_pages, path)
+        if page_count >= PDF_PARALLEL_MIN_PAGES:
+            # Waits on the page range futures in its own thread, so the io pool stays free
+            return await asyncio.to_thread(
+                lambda: list(DocumentService.iter_pdf_segments(path, process_pool, workers, min_pages=0))
+            )
+    return await loop.run_in_executor(process_pool, extract_document, path)
+
+def discover_files(folder: Path, recursive: bool) -> List[Path]:
+    """Find all supported files, sorted by name for consistent processing"""
     all_files = []
     if recursive:
         # Search recursively
@@ -133,52 +131,238 @@ async def process_folder(folder_path, prefix=None, recursive=True, metadata=None
         # Search only in the current folder
         for ext in SUPPORTED_EXTENSIONS:
             all_files.extend(list(folder.glob(f"*{ext}")))
-    
+    all_files.sort()
+    return all_files
+
+def build_call_name(folder: Path, file_path: Path, prefix=None, recursive=True) -> str:
+    # Add folder structure to call_name if recursive
+    if recursive and folder != file_path.parent:
+        relative_path = file_path.parent.relative_to(folder)
+        name = f"{relative_path} - {file_path.stem}"
+    else:
+        name = file_path.stem
+    # Use prefix if provided
+    return f"{prefix} - {name}" if prefix else name
+
+async def extract_stage(jobs: List[DocumentJob], encode_queue: asyncio.Queue, process_pool: ProcessPoolExecutor,
+                        workers: int, io_pool: ThreadPoolExecutor, max_in_flight: int, metadata: Dict[str, Any], progress: Progress):
+    """Extract and chunk files in worker processes, then plan their incremental update"""
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(max_in_flight)
+
+    async def prepare(job: DocumentJob):
+        async with semaphore:
+            try:
+                segments = await extract_segments(job, process_pool, workers, io_pool)
+                job.chunks, chunk_payloads = await loop.run_in_executor(io_pool, text_service.chunk_document, segments)
+                if not job.chunks:
+                    logger.warning(f"No text content extracted from {job.file_name}")
+                    progress.failed += 1
+                    return
+
+                # Check if a document with this name already exists (reuse its ID if updating)
+                existing_doc_id = await loop.run_in_executor(io_pool, qdrant_service.get_existing_doc_id, job.virtual_url)
+                job.is_update = existing_doc_id is not None
+                job.doc_id = existing_doc_id or str(uuid.uuid4())
+
+                job.plan = await loop.run_in_executor(
+                    io_pool,
+                    ingestion_service.plan_update,
+                    job.doc_id,
+                    job.chunks,
+                    {
+                        "url": job.virtual_url,
+                        "call_name": job.call_name,
+                        "date": datetime.now().isoformat(),
+                        "file_name": job.file_name,
+                        "file_type": job.file_type,
+                        **metadata
+                    },
+                    chunk_payloads,
+                    job.is_update
+                )
+                job.pending_chunks = len(job.plan.new_indices)
+            except Exception as e:
+                logger.error(f"Error processing {job.file_path}: {str(e)}")
+                progress.failed += 1
+                return
+
+            # Blocks while the encoder is behind, which in turn holds back extraction
+            await encode_queue.put(job)
+
+    await asyncio.gather(*(prepare(job) for job in jobs))
+    await encode_queue.put(None)
+
+async def encode_stage(encode_queue: asyncio.Queue, write_queue: asyncio.Queue, encode_pool: ThreadPoolExecutor,
+                       batch_size: int, progress: Progress, concurrency: int = 1):
+    """
+    Coalesce chunks from many documents into large encode batches
+
+    Up to `concurrency` batches are encoded at once, so an encoder pool with several
+    worker processes always has batches queued.
+    """
+    loop = asyncio.get_running_loop()
+    batch: List[Tuple[DocumentJob, int, str]] = []
+    finished = False
+    slots = asyncio.Semaphore(concurrency)
+    in_flight: Set[asyncio.Task] = set()
+
+    async def encode(current: List[Tuple[DocumentJob, int, str]]):
+        try:
+            embeddings = await loop.run_in_executor(
+                encode_pool, text_service.generate_embeddings, [text for _, _, text in current]
+            )
+        except Exception as e:
+            logger.error(f"Error generating embeddings: {str(e)}")
+            embeddings = [None] * len(current)
+        finally:
+            slots.release()
+        progress.chunks_encoded += len(current)
+
+        for (job, i, _), embedding in zip(current, embeddings):
+            if embedding is None:
+                job.encode_failed = True
+            else:
+                job.plan.embeddings[i] = embedding
+            job.pending_chunks -= 1
+            if job.pending_chunks == 0:
+                await write_queue.put(job)
+
+    while not finished or batch:
+        if not finished:
+            job = await encode_queue.get()
+            while True:
+                if job is None:
+                    finished = True
+                    break
+                if job.pending_chunks:
+                    batch.extend(zip([job] * job.pending_chunks, job.plan.new_indices, job.plan.texts_to_encode))
+                else:
+                    # Nothing changed, only the payload needs a refresh
+                    await write_queue.put(job)
+                if len(batch) >= batch_size:
+                    break
+                try:
+                    job = encode_queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+
+        # Encode full batches; flush a partial one only when no more input is waiting
+        while batch and (len(batch) >= batch_size or finished or encode_queue.empty()):
+            current, batch = batch[:batch_size], batch[batch_size:]
+            await slots.acquire()
+            task = asyncio.create_task(encode(current))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+
+    await asyncio.gather(*in_flight)
+    await write_queue.put(None)
+
+async def write_stage(write_queue: asyncio.Queue, io_pool: ThreadPoolExecutor, progress: Progress,
+                      results: List[Dict[str, Any]], wait: bool):
+    """Write finished documents to Qdrant while the encoder keeps working"""
+    loop = asyncio.get_running_loop()
+    while True:
+        job = await write_queue.get()
+        if job is None:
+            break
+        if job.encode_failed:
+            logger.error(f"Error processing {job.file_path}: embedding failed")
+            progress.failed += 1
+            continue
+
+        try:
+            await loop.run_in_executor(io_pool, ingestion_service.apply_update, job.plan, wait)
+        except Exception as e:
+            logger.error(f"Error processing {job.file_path}: {str(e)}")
+            progress.failed += 1
+            continue
+
+        counts = job.plan.counts
+        logger.info(
+            f"Successfully {'updated' if job.is_update else 'embedded'} {job.file_name} with {len(job.chunks)} chunks "
+            f"({counts['chunks_reused']} reused, {counts['chunks_added']} added, {counts['chunks_removed']} removed)"
+        )
+        progress.successful += 1
+        results.append({
+            "file_name": job.file_name,
+            "call_name": job.call_name,
+            "doc_id": job.doc_id,
+            "chunks": len(job.chunks),
+            "file_type": job.file_type,
+            **counts
+        })
+
+async def report_progress(progress: Progress, interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        progress.report()
+
+async def process_folder(folder_path, prefix=None, recursive=True, metadata=None, workers=None,
+                         batch_size=256, queue_size=32, progress_interval=10.0, wait=True):
+    """
+    Process all supported document files in a folder
+
+    Files flow through a staged pipeline connected by bounded queues: extraction in a
+    process pool, cross-document encode batches, and Qdrant writes overlapped with encoding.
+    """
+    if not os.path.isdir(folder_path):
+        logger.error(f"Error: {folder_path} is not a valid directory")
+        return
+
+    folder = Path(folder_path)
+    workers = workers or os.cpu_count() or 1
+    loop = asyncio.get_running_loop()
+
+    # Find all supported files
+    all_files = await loop.run_in_executor(None, discover_files, folder, recursive)
+
     if not all_files:
         logger.warning(f"No supported files found in {folder_path}")
         return []
-    
-    # Sort files by name for consistent processing
-    all_files.sort()
-    
+
     logger.info(f"Found {len(all_files)} supported files in {folder_path}")
-    
-    # Process files
-    results = []
-    successful = 0
-    failed = 0
-    
+
+    # Files with the same name map to the same document; like sequential
+    # processing, the last one in sorted order wins
+    jobs_by_name: Dict[str, DocumentJob] = {}
     for file_path in all_files:
-        # Use prefix if provided
-        if prefix:
-            # Add folder structure to call_name if recursive
-            if recursive and folder != file_path.parent:
-                relative_path = file_path.parent.relative_to(folder)
-                call_name = f"{prefix} - {relative_path} - {file_path.stem}"
-            else:
-                call_name = f"{prefix} - {file_path.stem}"
-        else:
-            # Add folder structure to call_name if recursive
-            if recursive and folder != file_path.parent:
-                relative_path = file_path.parent.relative_to(folder)
-                call_name = f"{relative_path} - {file_path.stem}"
-            else:
-                call_name = file_path.stem
-        
-        result = await process_document(
-            str(file_path), 
-            call_name=call_name, 
-            collection_name=collection_name,
-            metadata=metadata
+        if file_path.name in jobs_by_name:
+            logger.warning(f"Skipping {jobs_by_name[file_path.name].file_path}: superseded by {file_path}")
+        jobs_by_name[file_path.name] = DocumentJob(file_path, build_call_name(folder, file_path, prefix, recursive))
+    jobs = list(jobs_by_name.values())
+
+    progress = Progress(len(jobs))
+    results: List[Dict[str, Any]] = []
+    encode_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    write_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+    # Spawned, not forked: a forked copy of a process that already runs torch threads is
+    # not safe. Workers re-import this script, which leaves the model libraries unimported
+    process_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    io_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="upload-io")
+    # One batch at a time in-process; with an encoder pool, one in flight per worker process
+    encode_concurrency = text_service.encoder_pool.processes if text_service.encoder_pool else 1
+    encode_pool = ThreadPoolExecutor(max_workers=encode_concurrency, thread_name_prefix="upload-encode")
+    reporter = asyncio.create_task(report_progress(progress, progress_interval))
+    try:
+        await asyncio.gather(
+            extract_stage(jobs, encode_queue, process_pool, workers, io_pool, workers * 2, metadata or {}, progress),
+            encode_stage(encode_queue, write_queue, encode_pool, batch_size, progress, encode_concurrency),
+            write_stage(write_queue, io_pool, progress, results, wait)
         )
-        
-        if result:
-            results.append(result)
-            successful += 1
-        else:
-            failed += 1
-    
-    logger.info(f"Processing complete: {successful} successful, {failed} failed")
+        if not wait:
+            # Writes were only acknowledged; wait until Qdrant has applied all of them
+            logger.info("Waiting for Qdrant to apply pending writes...")
+            await loop.run_in_executor(io_pool, qdrant_service.flush)
+    finally:
+        reporter.cancel()
+        process_pool.shutdown(cancel_futures=True)
+        io_pool.shutdown()
+        encode_pool.shutdown()
+
+    progress.report()
+    logger.info(f"Processing complete: {progress.successful} successful, {progress.failed} failed")
     return results
 
 def parse_arguments():
@@ -188,11 +372,20 @@ def parse_arguments():
     parser.add_argument("--recursive", action="store_true", help="Search for files recursively in subfolders")
     parser.add_argument("--collection", type=str, help="Name of the Qdrant collection to use (uses default from settings if not specified)")
     parser.add_argument("--tag", action="append", help="Add metadata tags to documents (can be used multiple times: --tag key=value)")
+    parser.add_argument("--workers", type=int, help="Number of text extraction processes (default: number of CPUs)")
+    parser.add_argument("--batch-size", type=int, default=256, help="Number of chunks per embedding batch, across documents")
+    parser.add_argument("--queue-size", type=int, default=32, help="Documents buffered between pipeline stages")
+    parser.add_argument("--progress-interval", type=float, default=10.0, help="Seconds between progress reports")
+    parser.add_argument("--no-wait", action="store_true", help="Let Qdrant acknowledge writes before applying them; flushes once at the end")
+    parser.add_argument("--backend", choices=MODEL_BACKENDS, default=MODEL_BACKEND, help="Encoder inference backend (default: MODEL_BACKEND setting)")
+    parser.add_argument("--encoder-processes", type=int, default=ENCODER_PROCESSES, help="Encode in this many worker processes, each with its own model replica (default: ENCODER_PROCESSES, 0 encodes in-process)")
+    parser.add_argument("--encoder-threads", type=int, default=ENCODER_THREADS_PER_PROCESS, help="Intra-op threads per encoder process (default: CPU count / encoder processes)")
+    parser.add_argument("--token-budget", type=int, default=ENCODE_TOKEN_BUDGET, help="Padded tokens per model call; each embedding batch is split into length-sorted model calls of this size")
     return parser.parse_args()
 
 if __name__ == "__main__":
     args = parse_arguments()
-    
+
     # Process tags if provided
     metadata = {}
     if args.tag:
@@ -200,11 +393,21 @@ if __name__ == "__main__":
             if '=' in tag:
                 key, value = tag.split('=', 1)
                 metadata[key.strip()] = value.strip()
-    
-    asyncio.run(process_folder(
-        args.folder, 
-        prefix=args.prefix, 
-        recursive=args.recursive, 
-        metadata=metadata, 
-        collection_name=args.collection
-    )) 
\ No newline at end of file
+
+    init_services(collection_name=args.collection, backend=args.backend, token_budget=args.token_budget,
+                  encoder_processes=args.encoder_processes, encoder_threads=args.encoder_threads)
+    try:
+        asyncio.run(process_folder(
+            args.folder,
+            prefix=args.prefix,
+            recursive=args.recursive,
+            metadata=metadata,
+            workers=args.workers,
+            batch_size=args.batch_size,
+            queue_size=args.queue_size,
+            progress_interval=args.progress_interval,
+            wait=not args.no_wait
+        ))
+    finally:
+        if text_service.encoder_pool is not None:
+            text_service.encoder_pool.shutdown()
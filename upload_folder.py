@@ -1,23 +1,39 @@
 import os
 import argparse
 import asyncio
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor
 from pathlib import Path
 import uuid
 from datetime import datetime
 
 import PyPDF2
-from sentence_transformers import SentenceTransformer
 from app.services.document_service import DocumentService
-from app.services.text_service import TextService
-from app.services.qdrant_service import QdrantService
-from app.config.settings import MODEL_NAME
+from app.config.settings import ENCODER_PROCESSES, ENCODER_THREADS_PER_PROCESS, MODEL_BACKEND, MODEL_BACKENDS
 
-# Initialize services
+# Spawned page extraction workers re-import this script, so the services (and the model
+# libraries behind them) are only imported and created by init_services()
 document_service = DocumentService()
-text_service = TextService()
-qdrant_service = QdrantService()
+text_service = None
+qdrant_service = None
+ingestion_service = None
 
-async def process_pdf_file(file_path, call_name=None):
+def init_services(backend=MODEL_BACKEND, encoder_processes=ENCODER_PROCESSES, encoder_threads=ENCODER_THREADS_PER_PROCESS):
+    global text_service, qdrant_service, ingestion_service
+    from app.services.encoder_pool import EncoderPool
+    from app.services.ingestion_service import IngestionService
+    from app.services.qdrant_service import QdrantService
+    from app.services.text_service import TextService
+
+    text_service = TextService(backend=backend)
+    if encoder_processes > 0:
+        print(f"Starting {encoder_processes} encoder processes...")
+        text_service.encoder_pool = EncoderPool(encoder_processes, encoder_threads, backend)
+        text_service.encoder_pool.start()
+    qdrant_service = QdrantService(vector_size=text_service.vector_size)
+    ingestion_service = IngestionService(text_service, qdrant_service)
+
+async def process_pdf_file(file_path, call_name=None, executor: Executor = None, workers: int = 1):
     """Process a single PDF file and upload to Qdrant"""
     try:
         file_name = os.path.basename(file_path)
@@ -37,62 +53,48 @@ async def process_pdf_file(file_path, call_name=None):
         doc_id = existing_doc_id if existing_doc_id else str(uuid.uuid4())
         current_date = datetime.now().isoformat()
         
-        # If updating, delete existing chunks first
         if existing_doc_id:
-            qdrant_service.delete_document_chunks(doc_id)
             print(f"Updating existing document: {file_name}")
         else:
             print(f"Creating new document: {file_name}")
         
-        # Extract text from PDF
-        with open(file_path, 'rb') as f:
-            text = document_service.extract_text_from_pdf(f)
-        
-        # Split text into chunks and generate embeddings
-        chunks = text_service.chunk_text(text)
+        # Extract pages and split them into chunks as they arrive
+        chunks, chunk_payloads = text_service.chunk_document(document_service.iter_pdf_segments(file_path, executor, workers))
         
         if not chunks:
             print(f"Warning: No text content extracted from {file_name}")
             return
         
         print(f"Extracted {len(chunks)} chunks from {file_name}")
-        embeddings = text_service.generate_embeddings(chunks)
         
-        # Prepare points for Qdrant
-        points = []
-        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-            points.append(
-                {
-                    "id": str(uuid.uuid4()),
-                    "vector": embedding,
-                    "payload": {
-                        "text": chunk,
-                        "url": virtual_url,
-                        "call_name": call_name,
-                        "doc_id": doc_id,
-                        "chunk_id": i,
-                        "date": current_date,
-                        "total_chunks": len(chunks),
-                        "file_name": file_name
-                    }
-                }
-            )
-        
-        # Store in Qdrant
-        qdrant_service.upsert_points(points)
+        # Only new or changed chunks are embedded and stored
+        plan = ingestion_service.index_document(
+            doc_id,
+            chunks,
+            {
+                "url": virtual_url,
+                "call_name": call_name,
+                "date": current_date,
+                "file_name": file_name,
+                "file_type": "pdf"
+            },
+            chunk_payloads,
+            is_update=existing_doc_id is not None
+        )
         
         print(f"Successfully {'updated' if existing_doc_id else 'embedded'} {file_name} with {len(chunks)} chunks")
         return {
             "file_name": file_name,
             "call_name": call_name,
             "doc_id": doc_id,
-            "chunks": len(chunks)
+            "chunks": len(chunks),
+            **plan.counts
         }
     except Exception as e:
         print(f"Error processing {file_path}: {str(e)}")
         return None
 
-async def process_folder(folder_path, prefix=None):
+async def process_folder(folder_path, prefix=None, workers=None):
     """Process all PDF files in a folder"""
     if not os.path.isdir(folder_path):
         print(f"Error: {folder_path} is not a valid directory")
@@ -108,16 +110,19 @@ async def process_folder(folder_path, prefix=None):
     print(f"Found {len(pdf_files)} PDF files in {folder_path}")
     
     results = []
-    for pdf_file in pdf_files:
-        # Use prefix if provided
-        if prefix:
-            call_name = f"{prefix} - {pdf_file.stem}"
-        else:
-            call_name = pdf_file.stem
-            
-        result = await process_pdf_file(str(pdf_file), call_name)
-        if result:
-            results.append(result)
+    workers = workers or os.cpu_count() or 1
+    # Worker processes for extracting page ranges of large PDFs
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        for pdf_file in pdf_files:
+            # Use prefix if provided
+            if prefix:
+                call_name = f"{prefix} - {pdf_file.stem}"
+            else:
+                call_name = pdf_file.stem
+                
+            result = await process_pdf_file(str(pdf_file), call_name, executor, workers)
+            if result:
+                results.append(result)
     
     print(f"Successfully processed {len(results)} out of {len(pdf_files)} files")
     return results
@@ -126,8 +131,21 @@ def parse_arguments():
     parser = argparse.ArgumentParser(description="Upload folder of PDFs to Qdrant")
     parser.add_argument("folder", type=str, help="Path to folder containing PDF files")
     parser.add_argument("--prefix", type=str, help="Prefix to add to document names (optional)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="Processes for page-parallel extraction of large PDFs (default: CPU count)")
+    parser.add_argument("--backend", choices=MODEL_BACKENDS, default=MODEL_BACKEND,
+                        help="Encoder inference backend (default: MODEL_BACKEND setting)")
+    parser.add_argument("--encoder-processes", type=int, default=ENCODER_PROCESSES,
+                        help="Encode in this many worker processes, each with its own model replica (default: ENCODER_PROCESSES, 0 encodes in-process)")
+    parser.add_argument("--encoder-threads", type=int, default=ENCODER_THREADS_PER_PROCESS,
+                        help="Intra-op threads per encoder process (default: CPU count / encoder processes)")
     return parser.parse_args()
 
 if __name__ == "__main__":
     args = parse_arguments()
-    asyncio.run(process_folder(args.folder, args.prefix)) 
\ No newline at end of file
+    init_services(backend=args.backend, encoder_processes=args.encoder_processes, encoder_threads=args.encoder_threads)
+    try:
+        asyncio.run(process_folder(args.folder, args.prefix, args.workers))
+    finally:
+        if text_service.encoder_pool is not None:
+            text_service.encoder_pool.shutdown() 
\ No newline at end of file